@@ -1,10 +1,11 @@
 __all__ = [
     "chat",
     "health",
+    "metrics",
     "tools",
     "get_chat_service",
     "get_agent_service"
 ]
 
 from .dependencies import get_agent_service, get_chat_service
-from .routers import chat, health, tools
+from .routers import chat, health, metrics, tools
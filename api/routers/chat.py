@@ -1,26 +1,124 @@
+import asyncio
 import json
+import time
+from contextlib import suppress
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Optional, TypeVar
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
 from api import get_chat_service
+from config import settings
+from exception import ServiceException
 from models import (
+    BatchChatRequest,
     ChatHistoryResponse,
     ChatRequest,
     ChatResponse,
     StreamChatRequest,
+    StreamEventType,
 )
-from service import ChatService
+from monitoring import AGENT_RUNS_CANCELLED, STREAM_TIME_TO_FIRST_TOKEN, STREAM_TOKENS_PER_SECOND
+
+if TYPE_CHECKING:
+    from service import ChatService
 
 router = APIRouter(prefix="/chat", tags=["聊天"])
 
+# SSE注释行，客户端会忽略，只用于保持连接活跃
+SSE_HEARTBEAT = ": ping\n\n"
+_STREAM_END = object()
+
+T = TypeVar("T")
+
+
+def _format_sse(data: dict) -> str:
+    """将事件编码为SSE格式"""
+    event_type = data.get('type', 'message')
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"event: {event_type}\ndata: {payload}\n\n"
+
+
+async def _cancel_on_disconnect(app_request: Request, awaitable: Awaitable[T], endpoint: str) -> T:
+    """等待运行结果期间轮询客户端连接，断开时取消运行，避免继续调用LLM与工具"""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.disconnect_check_interval)
+            if done:
+                return task.result()
+            if await app_request.is_disconnected():
+                raise HTTPException(status_code=499, detail="客户端已断开连接")
+    finally:
+        if not task.done():
+            AGENT_RUNS_CANCELLED.labels(endpoint=endpoint).inc()
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+
+async def _guard_stream(
+        app_request: Request,
+        chunks: AsyncIterator[str],
+        endpoint: str,
+        heartbeat_interval: Optional[float] = None
+) -> AsyncIterator[str]:
+    """在独立任务中消费上游流，空闲时发送心跳，客户端断开或响应提前结束时取消上游运行"""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for chunk in chunks:
+                queue.put_nowait(chunk)
+        finally:
+            queue.put_nowait(_STREAM_END)
+
+    producer = asyncio.create_task(pump())
+    last_sent = last_checked = loop.time()
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(queue.get(), timeout=settings.disconnect_check_interval)
+            except asyncio.TimeoutError:
+                chunk = None
+
+            now = loop.time()
+            if now - last_checked >= settings.disconnect_check_interval:
+                last_checked = now
+                if await app_request.is_disconnected():
+                    return
+
+            if chunk is _STREAM_END:
+                break
+            if chunk is not None:
+                last_sent = now
+                yield chunk
+            elif heartbeat_interval and now - last_sent >= heartbeat_interval:
+                last_sent = now
+                yield SSE_HEARTBEAT
+
+        # 传递上游的异常
+        await producer
+    finally:
+        if not producer.done():
+            AGENT_RUNS_CANCELLED.labels(endpoint=endpoint).inc()
+            producer.cancel()
+            with suppress(asyncio.CancelledError):
+                await producer
+
 
 @router.post("/", response_model=ChatResponse)
 async def chat(request: ChatRequest, app_request: Request):
     """普通聊天接口"""
     try:
         chat_service: ChatService = get_chat_service(app_request)
-        return await chat_service.chat(request)
+        return await _cancel_on_disconnect(app_request, chat_service.chat(request), endpoint="chat")
+    except HTTPException:
+        raise
+    except ServiceException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message, headers=e.headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"处理请求时发生错误: {str(e)}")
 
@@ -30,33 +128,85 @@ async def stream_chat(request: StreamChatRequest, app_request: Request):
     """流式聊天接口"""
     try:
         chat_service: ChatService = get_chat_service(app_request)
+        # 在开始推送前完成准入检查，排队已满时直接返回429
+        ticket = chat_service.reserve_run(request.thread_id or "default")
 
         async def generate_stream():
+            started = time.perf_counter()
+            first_token_at = None
+            tokens = 0
             try:
-                async for data in chat_service.stream_chat(request):
-                    yield f"data: {json.dumps(data)}\n\n"
+                async for data in chat_service.stream_chat(request, ticket):
+                    if data.get('type') == StreamEventType.TOKEN:
+                        tokens += 1
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            STREAM_TIME_TO_FIRST_TOKEN.observe(first_token_at - started)
+                    yield _format_sse(data)
             except Exception as e:
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                yield _format_sse({'type': StreamEventType.ERROR, 'error': str(e)})
+            finally:
+                if first_token_at is not None and tokens > 1:
+                    elapsed = time.perf_counter() - first_token_at
+                    if elapsed > 0:
+                        STREAM_TOKENS_PER_SECOND.observe((tokens - 1) / elapsed)
 
         return StreamingResponse(
-            generate_stream(),
+            _guard_stream(app_request, generate_stream(), "stream", settings.sse_heartbeat_interval),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
                 "Access-Control-Allow-Origin": "*",
-            }
+                # 禁止反向代理缓冲，保证每个事件立即下发
+                "X-Accel-Buffering": "no",
+            },
+            # 生成器未被迭代就结束时（如客户端提前断开）释放排队名额
+            background=BackgroundTask(ticket.discard)
         )
+    except ServiceException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message, headers=e.headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"处理流式请求时发生错误: {str(e)}")
 
 
+@router.post("/batch")
+async def batch_chat(request: BatchChatRequest, app_request: Request):
+    """批量聊天接口，按完成顺序以NDJSON逐行返回每个条目的结果"""
+    try:
+        chat_service: ChatService = get_chat_service(app_request)
+        if len(request.items) > settings.batch_max_items:
+            raise HTTPException(status_code=413, detail=f"单次批量请求最多 {settings.batch_max_items} 条")
+
+        async def generate_results():
+            async for result in chat_service.batch_chat(request.items, request.concurrency):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(
+            _guard_stream(app_request, generate_results(), "batch"),
+            media_type="application/x-ndjson",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"处理批量请求时发生错误: {str(e)}")
+
+
 @router.get("/history/{thread_id}", response_model=ChatHistoryResponse)
-async def get_chat_history(thread_id: str, app_request: Request):
+async def get_chat_history(
+        thread_id: str,
+        app_request: Request,
+        limit: Optional[int] = Query(None, ge=1, le=500, description="返回的最大消息数量"),
+        before: Optional[str] = Query(None, description="分页游标，只返回该消息ID之前的消息")
+):
     """获取对话历史"""
     try:
         chat_service: ChatService = get_chat_service(app_request)
-        return await chat_service.get_chat_history(thread_id)
+        return await chat_service.get_chat_history(thread_id, limit=limit, before=before)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取历史记录时发生错误: {str(e)}")
 
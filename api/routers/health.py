@@ -1,6 +1,8 @@
-from fastapi import APIRouter
+from datetime import datetime, timezone
 
-from models import HealthResponse
+from fastapi import APIRouter, Request, Response
+
+from models import HealthResponse, ReadinessResponse, StartupReport
 
 router = APIRouter(prefix="/health", tags=["健康检查"])
 
@@ -9,3 +11,38 @@ router = APIRouter(prefix="/health", tags=["健康检查"])
 async def health_check():
     """健康检查接口"""
     return HealthResponse(status="healthy", message="Agent service is running")
+
+
+@router.get("/live", response_model=HealthResponse)
+async def liveness_check():
+    """存活检查接口：只要进程能够响应即为存活"""
+    return HealthResponse(status="alive", message="Agent service is running")
+
+
+@router.get("/ready", response_model=ReadinessResponse)
+async def readiness_check(request: Request, response: Response):
+    """就绪检查接口：检查各依赖，未就绪、已饱和或停机排空中时返回503"""
+    health_service = getattr(request.app.state, "health_service", None)
+    if not health_service:
+        response.status_code = 503
+        return ReadinessResponse(
+            status="starting",
+            checked_at=datetime.now(timezone.utc).isoformat(),
+            cached=False,
+            checks={}
+        )
+
+    readiness = await health_service.check_readiness()
+    if readiness.status in ("not_ready", "saturated", "draining"):
+        response.status_code = 503
+    return readiness
+
+
+@router.get("/startup", response_model=StartupReport)
+async def startup_report(request: Request, response: Response):
+    """启动耗时接口：返回各启动阶段的耗时，启动未完成时返回503"""
+    report = getattr(request.app.state, "startup_report", None)
+    if not report:
+        response.status_code = 503
+        return StartupReport()
+    return StartupReport(**report)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from monitoring import get_registry
+
+router = APIRouter(tags=["监控"])
+
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus指标接口，多worker部署时汇总所有worker的指标"""
+    return Response(content=generate_latest(get_registry()), media_type=CONTENT_TYPE_LATEST)
@@ -12,12 +12,13 @@ async def get_available_tools(request: Request):
     try:
         agent_service = get_agent_service(request)
         tools = agent_service.get_tools()
+        tool_stats = agent_service.get_tool_stats()
 
         tool_info = [
-            ToolInfo(name=tool.name, description=tool.description)
+            ToolInfo(name=tool.name, description=tool.description, cache_stats=tool_stats.get(tool.name))
             for tool in tools
         ]
 
-        return ToolsResponse(tools=tool_info)
+        return ToolsResponse(tools=tool_info, mcp_servers=agent_service.get_mcp_stats())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取工具列表时发生错误: {str(e)}")
@@ -0,0 +1 @@
+"""基准测试工具：本地替身服务（LLM、Embedding）与压测客户端"""
@@ -0,0 +1,65 @@
+"""对比两次基准测试结果，超过阈值的退化以非零退出码返回
+
+用法: python -m benchmark.compare baseline.json current.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+# (指标路径, 数值越大越好)
+METRICS = [
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p95"), False),
+    (("latency_ms", "p99"), False),
+    (("ttft_ms", "p50"), False),
+    (("ttft_ms", "p99"), False),
+    (("rps",), True),
+]
+
+
+def _load(path: str) -> Dict[Tuple[str, int], Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return {(item["endpoint"], item["concurrency"]): item for item in report["results"]}
+
+
+def _get(item: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    value: Any = item
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两次基准测试结果")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1, help="允许的相对退化比例")
+    args = parser.parse_args()
+
+    baseline, current = _load(args.baseline), _load(args.current)
+    regressions = 0
+    for key in sorted(baseline.keys() & current.keys()):
+        endpoint, concurrency = key
+        for path, higher_is_better in METRICS:
+            before, after = _get(baseline[key], path), _get(current[key], path)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            regressed = -change > args.threshold if higher_is_better else change > args.threshold
+            regressions += regressed
+            print(
+                f"{endpoint:>6} c={concurrency:<3} {'.'.join(path):<14} "
+                f"{before:>10} -> {after:<10} {change:+.1%}{'  退化' if regressed else ''}"
+            )
+
+    if regressions:
+        print(f"发现 {regressions} 项超过 {args.threshold:.0%} 的退化")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
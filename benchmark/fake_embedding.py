@@ -0,0 +1,63 @@
+"""Ollama兼容的本地替身Embedding服务，相同文本总是得到相同的向量
+
+用法: python -m benchmark.fake_embedding --port 18002 --dimension 768 --latency 0.01
+"""
+import argparse
+import asyncio
+import hashlib
+from typing import List
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+
+
+def fake_embedding(text: str, dimension: int) -> List[float]:
+    """由文本哈希确定的单位向量"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    return vector.tolist()
+
+
+def create_app(dimension: int, latency: float) -> FastAPI:
+    """创建替身Embedding应用"""
+    app = FastAPI(title="Fake Ollama embeddings")
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "fake-embedding", "model": "fake-embedding"}]}
+
+    @app.post("/api/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        return {"embedding": fake_embedding(str(body.get("prompt", "")), dimension)}
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        inputs = body.get("input", "")
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        await asyncio.sleep(latency)
+        return {
+            "model": body.get("model", "fake-embedding"),
+            "embeddings": [fake_embedding(str(text), dimension) for text in inputs],
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ollama兼容的替身Embedding服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18002)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--latency", type=float, default=0.01, help="每次请求的延迟（秒）")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.dimension, args.latency), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""OpenAI兼容的本地替身LLM服务，可配置首token延迟与输出速率
+
+用法: python -m benchmark.fake_llm --port 18001 --ttft 0.2 --token-rate 50 --output-tokens 64
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+KNOWLEDGE_TOOL_NAME = "knowledge_base_retriever"
+WORDS = ["本地", "模型", "正在", "生成", "测试", "回答", "用于", "衡量", "吞吐", "延迟"]
+
+
+@dataclass
+class FakeLLMConfig:
+    """替身LLM的行为配置"""
+    ttft: float = 0.2
+    token_rate: float = 50.0
+    output_tokens: int = 64
+    tool_call_ratio: float = 0.0
+    seed: Optional[int] = None
+
+
+def _approx_tokens(messages: List[Dict[str, Any]]) -> int:
+    """按字符数粗略估计输入token数"""
+    return sum(len(str(message.get("content") or "")) for message in messages) // 2 + 1
+
+
+def _should_call_tool(config: FakeLLMConfig, rng: random.Random, body: Dict[str, Any]) -> bool:
+    """最后一条是用户消息且提供了知识库工具时，按比例发起一次工具调用"""
+    messages = body.get("messages") or []
+    tools = [tool.get("function", {}).get("name") for tool in body.get("tools") or []]
+    return (
+            KNOWLEDGE_TOOL_NAME in tools
+            and bool(messages) and messages[-1].get("role") == "user"
+            and rng.random() < config.tool_call_ratio
+    )
+
+
+def create_app(config: FakeLLMConfig) -> FastAPI:
+    """创建替身LLM应用"""
+    app = FastAPI(title="Fake OpenAI-compatible LLM")
+    rng = random.Random(config.seed)
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "fake-model", "object": "model", "owned_by": "benchmark"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "fake-model")
+        prompt_tokens = _approx_tokens(body.get("messages") or [])
+
+        tool_call = None
+        if _should_call_tool(config, rng, body):
+            query = str(body["messages"][-1].get("content") or "")
+            tool_call = {
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": KNOWLEDGE_TOOL_NAME, "arguments": json.dumps({"query": query}, ensure_ascii=False)},
+            }
+        words = [] if tool_call else [rng.choice(WORDS) for _ in range(config.output_tokens)]
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(words) or 1,
+            "total_tokens": prompt_tokens + (len(words) or 1),
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.ttft + len(words) / config.token_rate)
+            message = {"role": "assistant", "content": "".join(words)}
+            if tool_call:
+                message["tool_calls"] = [tool_call]
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if tool_call else "stop",
+                }],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        async def generate():
+            await asyncio.sleep(config.ttft)
+            yield chunk({"role": "assistant", "content": ""})
+            if tool_call:
+                yield chunk({"tool_calls": [{"index": 0, **tool_call}]})
+                yield chunk({}, "tool_calls")
+            else:
+                interval = 1.0 / config.token_rate
+                for word in words:
+                    yield chunk({"content": word})
+                    await asyncio.sleep(interval)
+                yield chunk({}, "stop")
+            if include_usage:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": usage,
+                }
+                yield f"data: {json.dumps(payload)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(generate(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI兼容的替身LLM服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18001)
+    parser.add_argument("--ttft", type=float, default=0.2, help="首token延迟（秒）")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="每秒输出token数")
+    parser.add_argument("--output-tokens", type=int, default=64, help="每次回答的token数")
+    parser.add_argument("--tool-call-ratio", type=float, default=0.0, help="用户消息触发知识库工具调用的比例")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        ttft=args.ttft,
+        token_rate=args.token_rate,
+        output_tokens=args.output_tokens,
+        tool_call_ratio=args.tool_call_ratio,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
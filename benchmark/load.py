@@ -0,0 +1,140 @@
+"""压测客户端：以逐级增加的并发数请求 /chat/ 与 /chat/stream，统计延迟分位数、首token时间与吞吐"""
+import asyncio
+import sys
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ENDPOINTS = {
+    "chat": "/chat/",
+    "stream": "/chat/stream",
+}
+
+
+@dataclass
+class _Sample:
+    """单次请求的测量结果"""
+    latency: float
+    ttft: Optional[float] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class LoadConfig:
+    """压测配置"""
+    base_url: str
+    endpoints: List[str] = field(default_factory=lambda: ["chat", "stream"])
+    levels: List[int] = field(default_factory=lambda: [1, 2, 4, 8, 16])
+    requests_per_level: int = 50
+    message: str = "请简单介绍一下知识库中的内容"
+    timeout: float = 120.0
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """线性插值分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    """汇总为毫秒单位的分位数统计"""
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "p50": ms(percentile(values, 0.50)),
+        "p95": ms(percentile(values, 0.95)),
+        "p99": ms(percentile(values, 0.99)),
+        "mean": ms(sum(values) / len(values)) if values else None,
+        "max": ms(max(values)) if values else None,
+    }
+
+
+async def _request_chat(client: httpx.AsyncClient, payload: Dict[str, str]) -> _Sample:
+    start = time.perf_counter()
+    response = await client.post(ENDPOINTS["chat"], json=payload)
+    latency = time.perf_counter() - start
+    if response.status_code != 200:
+        return _Sample(latency, error=f"http_{response.status_code}")
+    return _Sample(latency)
+
+
+async def _request_stream(client: httpx.AsyncClient, payload: Dict[str, str]) -> _Sample:
+    start = time.perf_counter()
+    ttft = None
+    error = None
+    async with client.stream("POST", ENDPOINTS["stream"], json=payload) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return _Sample(time.perf_counter() - start, error=f"http_{response.status_code}")
+        async for line in response.aiter_lines():
+            if line == "event: token" and ttft is None:
+                ttft = time.perf_counter() - start
+            elif line == "event: error":
+                error = "stream_error"
+    return _Sample(time.perf_counter() - start, ttft=ttft, error=error)
+
+
+async def run_level(client: httpx.AsyncClient, config: LoadConfig, endpoint: str, concurrency: int) -> Dict[str, Any]:
+    """以固定并发数发送一组请求，每个虚拟用户在自己的会话上顺序发送多轮消息"""
+    request = _request_stream if endpoint == "stream" else _request_chat
+    run_id = uuid.uuid4().hex[:8]
+    remaining = config.requests_per_level
+    samples: List[_Sample] = []
+
+    async def worker(worker_id: int):
+        nonlocal remaining
+        payload = {"message": config.message, "thread_id": f"bench-{run_id}-{endpoint}-{worker_id}"}
+        while remaining > 0:
+            remaining -= 1
+            try:
+                samples.append(await request(client, payload))
+            except httpx.HTTPError as e:
+                samples.append(_Sample(0.0, error=type(e).__name__))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    succeeded = [sample for sample in samples if sample.error is None]
+    result = {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": len(samples) - len(succeeded),
+        "error_kinds": dict(Counter(sample.error for sample in samples if sample.error)),
+        "duration_s": round(elapsed, 3),
+        "rps": round(len(succeeded) / elapsed, 3) if elapsed else None,
+        "latency_ms": summarize([sample.latency for sample in succeeded]),
+    }
+    if endpoint == "stream":
+        result["ttft_ms"] = summarize([sample.ttft for sample in succeeded if sample.ttft is not None])
+    return result
+
+
+async def run_load(config: LoadConfig) -> List[Dict[str, Any]]:
+    """按端点与并发等级依次压测"""
+    limits = httpx.Limits(max_connections=max(config.levels) * 2, max_keepalive_connections=max(config.levels))
+    results = []
+    async with httpx.AsyncClient(base_url=config.base_url, timeout=config.timeout, limits=limits) as client:
+        for endpoint in config.endpoints:
+            for concurrency in config.levels:
+                result = await run_level(client, config, endpoint, concurrency)
+                results.append(result)
+                # 进度输出到标准错误，标准输出只用于JSON结果
+                print(
+                    f"{endpoint:>6} c={concurrency:<3} rps={result['rps']} "
+                    f"p50={result['latency_ms']['p50']}ms p99={result['latency_ms']['p99']}ms "
+                    f"ttft_p50={result.get('ttft_ms', {}).get('p50')}ms errors={result['errors']}",
+                    file=sys.stderr
+                )
+    return results
@@ -0,0 +1,220 @@
+"""基准测试入口：启动本地替身服务与被测应用，逐级压测并输出JSON结果
+
+用法:
+    python -m benchmark.run --levels 1,4,16 --requests 50 --output bench.json
+    python -m benchmark.run --target http://localhost:8080   # 只压测已运行的服务
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmark.fake_embedding import fake_embedding
+from benchmark.load import LoadConfig, run_load
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLLECTION_NAME = "benchmark"
+
+
+def _wait_until_ready(url: str, timeout: float, process: Optional[subprocess.Popen] = None):
+    """轮询直到URL返回200"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"进程已退出（退出码 {process.returncode}）: {url}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"等待服务就绪超时: {url}")
+
+
+def _spawn(stack: ExitStack, args: List[str], env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    """启动子进程，退出时终止；子进程的输出重定向到标准错误，避免混入JSON结果"""
+    process = subprocess.Popen(args, cwd=ROOT_DIR, env=env, stdout=sys.stderr)
+
+    def stop():
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    stack.callback(stop)
+    return process
+
+
+def _seed_collection(host: str, port: int, count: int, dimension: int):
+    """向测试集合写入合成文档，向量与替身Embedding服务一致"""
+    import chromadb
+
+    client = chromadb.HttpClient(host=host, port=port)
+    collection = client.get_or_create_collection(COLLECTION_NAME, embedding_function=None)
+    documents = [f"基准测试文档 {index}：本地知识库中的第 {index} 段示例内容。" for index in range(count)]
+    for start in range(0, count, 100):
+        batch = documents[start:start + 100]
+        collection.upsert(
+            ids=[f"bench-{start + offset}" for offset in range(len(batch))],
+            documents=batch,
+            embeddings=[fake_embedding(document, dimension) for document in batch],
+            metadatas=[{"source": "benchmark", "index": start + offset} for offset in range(len(batch))],
+        )
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _start_stack(stack: ExitStack, args) -> str:
+    """启动替身服务、Chroma与被测应用，返回被测应用地址"""
+    python = sys.executable
+    host = "127.0.0.1"
+    llm_port, embedding_port, chroma_port, app_port = args.base_port, args.base_port + 1, args.base_port + 2, args.base_port + 3
+    work_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="local-agent-bench-"))
+
+    llm = _spawn(stack, [
+        python, "-m", "benchmark.fake_llm", "--host", host, "--port", str(llm_port),
+        "--ttft", str(args.llm_ttft), "--token-rate", str(args.llm_token_rate),
+        "--output-tokens", str(args.llm_output_tokens), "--tool-call-ratio", str(args.tool_call_ratio),
+        "--seed", "0",
+    ])
+    embedding = _spawn(stack, [
+        python, "-m", "benchmark.fake_embedding", "--host", host, "--port", str(embedding_port),
+        "--dimension", str(args.embedding_dimension), "--latency", str(args.embedding_latency),
+    ])
+
+    chroma_host, chroma_port = args.chroma_host, args.chroma_port
+    if not chroma_host:
+        # chromadb自带的本地服务端，数据写在临时目录
+        chroma_host = host
+        chroma_cli = shutil.which("chroma") or "chroma"
+        chroma = _spawn(stack, [
+            chroma_cli, "run", "--host", host, "--port", str(chroma_port), "--path", os.path.join(work_dir, "chroma"),
+        ])
+        _wait_until_ready(f"http://{host}:{chroma_port}/api/v2/heartbeat", 60, chroma)
+
+    _wait_until_ready(f"http://{host}:{llm_port}/v1/models", 30, llm)
+    _wait_until_ready(f"http://{host}:{embedding_port}/api/tags", 30, embedding)
+    if args.seed_docs:
+        _seed_collection(chroma_host, chroma_port, args.seed_docs, args.embedding_dimension)
+
+    env = dict(os.environ)
+    env.update({
+        "LLM_MODEL": "fake-model",
+        "LLM_BASE_URL": f"http://{host}:{llm_port}/v1",
+        "LLM_API_KEY": "benchmark",
+        "EMBEDDING_MODEL": "fake-embedding",
+        "EMBEDDING_BASE_URL": f"http://{host}:{embedding_port}",
+        "CHROMA_HOST": chroma_host,
+        "CHROMA_PORT": str(chroma_port),
+        "COLLECTION_NAME": COLLECTION_NAME,
+        "CHECKPOINTER_BACKEND": args.checkpointer,
+        "DB_URI": env.get("DB_URI", "postgresql://unused"),
+        "MCP_ENABLED": "false",
+        "LANGSMITH_TRACING": "false",
+        "CHECKPOINT_RETENTION_ENABLED": "false",
+        "EMBEDDING_CACHE_PATH": os.path.join(work_dir, "embeddings.sqlite3"),
+        "LLM_CACHE_PATH": os.path.join(work_dir, "llm_cache.sqlite3"),
+        "MCP_TOOL_SCHEMA_CACHE_PATH": os.path.join(work_dir, "mcp_tools.json"),
+        "PORT": str(app_port),
+    })
+    app = _spawn(stack, [
+        python, "-m", "uvicorn", "main:create_app", "--factory",
+        "--host", host, "--port", str(app_port), "--log-level", "warning",
+    ], env=env)
+
+    base_url = f"http://{host}:{app_port}"
+    _wait_until_ready(f"{base_url}/health/ready", args.startup_timeout, app)
+    return base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="local-agent 基准测试")
+    parser.add_argument("--target", help="已运行服务的地址，指定时不启动替身服务与被测应用")
+    parser.add_argument("--endpoints", default="chat,stream", help="压测端点，可选 chat,stream")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="逐级增加的并发数")
+    parser.add_argument("--requests", type=int, default=50, help="每个并发等级的请求数")
+    parser.add_argument("--message", default="请简单介绍一下知识库中的内容")
+    parser.add_argument("--output", help="结果JSON路径，默认输出到标准输出")
+    parser.add_argument("--checkpointer", choices=["memory", "postgres"], default="memory")
+    parser.add_argument("--base-port", type=int, default=18001, help="替身服务与被测应用依次使用的起始端口")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--llm-ttft", type=float, default=0.2)
+    parser.add_argument("--llm-token-rate", type=float, default=50.0)
+    parser.add_argument("--llm-output-tokens", type=int, default=64)
+    parser.add_argument("--tool-call-ratio", type=float, default=0.0)
+    parser.add_argument("--embedding-dimension", type=int, default=768)
+    parser.add_argument("--embedding-latency", type=float, default=0.01)
+    parser.add_argument("--chroma-host", help="使用已有的Chroma服务，默认启动本地临时实例")
+    parser.add_argument("--chroma-port", type=int, default=None)
+    parser.add_argument("--seed-docs", type=int, default=200, help="写入测试集合的合成文档数")
+    args = parser.parse_args()
+    if args.chroma_port is None:
+        args.chroma_port = args.base_port + 2 if not args.chroma_host else 8000
+
+    load_config = LoadConfig(
+        base_url=args.target or "",
+        endpoints=[endpoint for endpoint in args.endpoints.split(",") if endpoint],
+        levels=[int(level) for level in args.levels.split(",") if level],
+        requests_per_level=args.requests,
+        message=args.message,
+    )
+
+    with ExitStack() as stack:
+        if not args.target:
+            load_config.base_url = _start_stack(stack, args)
+        results = asyncio.run(run_load(load_config))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": args.target,
+            "checkpointer": None if args.target else args.checkpointer,
+            "fake_llm": None if args.target else {
+                "ttft": args.llm_ttft,
+                "token_rate": args.llm_token_rate,
+                "output_tokens": args.llm_output_tokens,
+                "tool_call_ratio": args.tool_call_ratio,
+            },
+            "fake_embedding": None if args.target else {
+                "dimension": args.embedding_dimension,
+                "latency": args.embedding_latency,
+            },
+            "load": asdict(load_config),
+        },
+        "results": results,
+    }
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+__all__ = [
+    "EmbeddingCache",
+    "CachedEmbeddings",
+    "RetrievalCache",
+    "PostgresLLMCache",
+    "SQLiteLLMCache",
+    "ToolResultCache",
+    "VectorReplica",
+    "cache_tool",
+    "create_cached_embeddings",
+    "normalize_text",
+    "bump_collection_version",
+    "aget_collection_version"
+]
+
+from .collection_version import aget_collection_version, bump_collection_version
+from .embedding_cache import CachedEmbeddings, EmbeddingCache, create_cached_embeddings, normalize_text
+from .llm_cache import PostgresLLMCache, SQLiteLLMCache
+from .retrieval_cache import RetrievalCache
+from .tool_cache import ToolResultCache, cache_tool
+from .vector_replica import VectorReplica
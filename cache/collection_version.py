@@ -0,0 +1,29 @@
+import time
+
+# 集合版本号保存在一个独立的元数据集合中，避免修改主集合的索引配置
+VERSION_KEY = "version"
+
+
+def version_collection_name(collection_name: str) -> str:
+    """获取保存版本号的元数据集合名称"""
+    return f"{collection_name}__version"
+
+
+def bump_collection_version(client, collection_name: str) -> str:
+    """更新集合版本号（入库脚本在写入完成后调用）"""
+    version = str(time.time_ns())
+    collection = client.get_or_create_collection(
+        name=version_collection_name(collection_name),
+        embedding_function=None
+    )
+    collection.modify(metadata={VERSION_KEY: version})
+    return version
+
+
+async def aget_collection_version(async_client, collection_name: str) -> str:
+    """读取集合版本号，集合从未被脚本写入时返回空字符串"""
+    collection = await async_client.get_or_create_collection(
+        name=version_collection_name(collection_name),
+        embedding_function=None
+    )
+    return str((collection.metadata or {}).get(VERSION_KEY, ""))
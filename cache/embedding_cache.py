@@ -0,0 +1,233 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import settings
+
+# SQLite单条语句的参数数量有上限，批量查询时按此大小分批
+_SQLITE_BATCH_SIZE = 500
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：Unicode归一化并折叠空白字符"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class EmbeddingCache:
+    """两级向量缓存：进程内LRU + 磁盘SQLite（float32存储，按容量淘汰）
+
+    磁盘缓存由多个worker与入库脚本共享，容量按数据库文件中已使用的页计算，而不是在进程内累计
+    """
+
+    def __init__(self, path: Optional[str], memory_size: int = 10000, max_bytes: int = 512 * 1024 * 1024):
+        self.memory_size = memory_size
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            self._open_disk(path)
+
+    def _open_disk(self, path: str):
+        """打开磁盘缓存数据库"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+
+    @staticmethod
+    def make_key(model: str, text: str, kind: str = "document") -> str:
+        """生成缓存键：(模型, 文本类型, 规范化文本哈希)
+
+        查询与文档可能使用不同的指令前缀，因此分开缓存
+        """
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{model}:{kind}:{digest}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """批量读取缓存，返回命中的键值"""
+        found: Dict[str, List[float]] = {}
+        disk_keys = []
+
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector.tolist()
+                    self.memory_hits += 1
+                else:
+                    disk_keys.append(key)
+
+            if disk_keys and self._conn:
+                rows = []
+                for start in range(0, len(disk_keys), _SQLITE_BATCH_SIZE):
+                    batch = disk_keys[start:start + _SQLITE_BATCH_SIZE]
+                    placeholders = ",".join("?" * len(batch))
+                    rows.extend(self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ).fetchall())
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key, _ in rows]
+                )
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._put_memory(key, vector)
+                    found[key] = vector.tolist()
+                    self.disk_hits += 1
+
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """批量写入缓存"""
+        with self._lock:
+            rows = []
+            now = time.time()
+            for key, values in items.items():
+                vector = np.asarray(values, dtype=np.float32)
+                self._put_memory(key, vector)
+                blob = vector.tobytes()
+                rows.append((key, blob, len(blob), now))
+
+            if rows and self._conn:
+                # 出错时回滚，避免连接停留在未结束的事务中
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings(key, vector, size, last_access) VALUES (?, ?, ?, ?)",
+                        rows
+                    )
+                disk_bytes = self._disk_size()
+                if disk_bytes > self.max_bytes:
+                    self._evict_disk(disk_bytes)
+
+    def _disk_size(self) -> int:
+        """数据库文件中已使用的字节数（不含已释放、可复用的空闲页）"""
+        page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist_count = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        return (page_count - freelist_count) * page_size
+
+    def _put_memory(self, key: str, vector: np.ndarray):
+        """写入内存LRU层"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, disk_bytes: int):
+        """按最近访问时间淘汰磁盘条目，直到容量降至上限的90%"""
+        target = int(self.max_bytes * 0.9)
+        while disk_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_access LIMIT ?", (_SQLITE_BATCH_SIZE,)
+            ).fetchall()
+            if not rows:
+                break
+
+            evicted = []
+            freed = 0
+            for key, size in rows:
+                if freed >= disk_bytes - target:
+                    break
+                evicted.append((key,))
+                freed += size
+
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+            disk_bytes = self._disk_size()
+
+    def stats(self) -> Dict[str, float]:
+        """缓存命中统计"""
+        total = self.memory_hits + self.disk_hits + self.misses
+        with self._lock:
+            disk_bytes = self._disk_size() if self._conn else 0
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / total if total else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_bytes": disk_bytes,
+        }
+
+    def close(self):
+        """关闭磁盘缓存"""
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+
+class CachedEmbeddings(Embeddings):
+    """带缓存的Embedding包装器，只对未命中的文本调用底层模型"""
+
+    def __init__(self, underlying: Embeddings, model: str, cache: EmbeddingCache):
+        self.underlying = underlying
+        self.model = model
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [EmbeddingCache.make_key(self.model, text) for text in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = EmbeddingCache.make_key(self.model, text, kind="query")
+        found = self.cache.get_many([key])
+        if key in found:
+            return found[key]
+
+        vector = self.underlying.embed_query(text)
+        self.cache.put_many({key: vector})
+        return vector
+
+
+def create_cached_embeddings(underlying: Embeddings, model: str) -> Embeddings:
+    """按配置创建带缓存的Embedding，服务与入库脚本共用同一份缓存"""
+    if not settings.embedding_cache_enabled:
+        return underlying
+
+    cache = EmbeddingCache(
+        path=settings.embedding_cache_path,
+        memory_size=settings.embedding_cache_memory_size,
+        max_bytes=settings.embedding_cache_max_bytes
+    )
+    return CachedEmbeddings(underlying, model, cache)
@@ -0,0 +1,183 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Sequence
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import ChatGeneration, Generation
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at DOUBLE PRECISION NOT NULL,
+    expires_at DOUBLE PRECISION NOT NULL
+)
+"""
+_CREATE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache(created_at)"
+_POSTGRES_PRUNE_SQL = """
+DELETE FROM llm_cache WHERE expires_at < %s
+   OR key IN (SELECT key FROM llm_cache ORDER BY created_at DESC OFFSET %s)
+"""
+_SQLITE_PRUNE_SQL = """
+DELETE FROM llm_cache WHERE expires_at < ?
+   OR key IN (SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)
+"""
+
+# 每写入多少次执行一次过期与容量清理
+_PRUNE_EVERY = 100
+
+
+def _make_key(prompt: str, llm_string: str) -> str:
+    """缓存键：模型与调用参数（含工具定义）+ 完整消息列表
+
+    消息ID不参与计算：LangGraph为每条新消息生成随机ID，否则相同的对话永远无法命中
+    """
+    return hashlib.sha256(f"{llm_string}\0{_normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+
+def _normalize_prompt(prompt: str) -> str:
+    """去掉序列化消息列表中每条消息的ID，无法解析时原样返回"""
+    try:
+        messages = loads(prompt)
+    except Exception:
+        return prompt
+    if not isinstance(messages, list):
+        return prompt
+    return dumps([
+        message.model_copy(update={"id": None}) if getattr(message, "id", None) is not None else message
+        for message in messages
+    ])
+
+
+def _strip_ids(generations: Sequence[Generation]) -> RETURN_VAL_TYPE:
+    """去掉缓存消息的ID，避免命中时与会话中已有的消息ID冲突"""
+    result = []
+    for generation in generations:
+        if isinstance(generation, ChatGeneration) and generation.message.id is not None:
+            generation = generation.model_copy(update={"message": generation.message.model_copy(update={"id": None})})
+        result.append(generation)
+    return result
+
+
+def _cacheable(generations: Sequence[Generation], cache_tool_calls: bool) -> bool:
+    """默认不缓存包含工具调用的响应，工具结果会随时间变化"""
+    if cache_tool_calls:
+        return True
+    return not any(
+        isinstance(generation, ChatGeneration) and getattr(generation.message, "tool_calls", None)
+        for generation in generations
+    )
+
+
+class PostgresLLMCache(BaseCache):
+    """基于现有Postgres连接池的LLM响应缓存，带TTL与条目数上限"""
+
+    def __init__(self, pool, ttl: float, max_entries: int, cache_tool_calls: bool = False):
+        self.pool = pool
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_tool_calls = cache_tool_calls
+        self._writes = 0
+
+    async def setup(self):
+        """创建缓存表"""
+        async with self.pool.connection() as conn:
+            await conn.execute(_CREATE_TABLE_SQL)
+            await conn.execute(_CREATE_INDEX_SQL)
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT value FROM llm_cache WHERE key = %s AND expires_at > %s",
+                (_make_key(prompt, llm_string), time.time())
+            )
+            row = await cur.fetchone()
+        return _strip_ids(loads(row[0])) if row else None
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if not _cacheable(return_val, self.cache_tool_calls):
+            return
+
+        now = time.time()
+        async with self.pool.connection() as conn:
+            await conn.execute(
+                "INSERT INTO llm_cache(key, value, created_at, expires_at) VALUES (%s, %s, %s, %s) "
+                "ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, "
+                "created_at = EXCLUDED.created_at, expires_at = EXCLUDED.expires_at",
+                (_make_key(prompt, llm_string), dumps(_strip_ids(return_val)), now, now + self.ttl)
+            )
+
+            self._writes += 1
+            if self._writes % _PRUNE_EVERY == 0:
+                await conn.execute(_POSTGRES_PRUNE_SQL, (now, self.max_entries))
+
+    async def aclear(self, **kwargs: Any) -> None:
+        async with self.pool.connection() as conn:
+            await conn.execute("DELETE FROM llm_cache")
+
+    # 服务只使用异步调用路径，同步接口视为未命中
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        return None
+
+    def clear(self, **kwargs: Any) -> None:
+        return None
+
+
+class SQLiteLLMCache(BaseCache):
+    """基于本地SQLite文件的LLM响应缓存，带TTL与条目数上限"""
+
+    def __init__(self, path: str, ttl: float, max_entries: int, cache_tool_calls: bool = False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_tool_calls = cache_tool_calls
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_CREATE_TABLE_SQL)
+        self._conn.execute(_CREATE_INDEX_SQL)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM llm_cache WHERE key = ? AND expires_at > ?",
+                (_make_key(prompt, llm_string), time.time())
+            ).fetchone()
+        return _strip_ids(loads(row[0])) if row else None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if not _cacheable(return_val, self.cache_tool_calls):
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache(key, value, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (_make_key(prompt, llm_string), dumps(_strip_ids(return_val)), now, now + self.ttl)
+            )
+            self._writes += 1
+            if self._writes % _PRUNE_EVERY == 0:
+                self._conn.execute(_SQLITE_PRUNE_SQL, (now, self.max_entries))
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return await asyncio.to_thread(self.lookup, prompt, llm_string)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        await asyncio.to_thread(self.update, prompt, llm_string, return_val)
+
+    async def aclear(self, **kwargs: Any) -> None:
+        await asyncio.to_thread(self.clear)
@@ -0,0 +1,133 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cache.embedding_cache import normalize_text
+
+
+@dataclass
+class _RetrievalEntry:
+    """检索缓存条目"""
+    value: Any
+    version: str
+    created_at: float
+    cost: float
+    embedding: Optional[np.ndarray] = None
+
+
+class RetrievalCache:
+    """检索结果缓存：精确匹配规范化查询，可选按查询向量相似度匹配近似查询
+
+    条目带TTL，并绑定写入时的集合版本号，版本变化后自动失效
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0, similarity_threshold: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[Tuple, _RetrievalEntry]" = OrderedDict()
+
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def make_key(query: str, *params) -> Tuple:
+        """生成缓存键：规范化查询 + 检索参数"""
+        return (normalize_text(query).lower(),) + tuple(params)
+
+    def get(self, key: Tuple, version: str) -> Optional[Any]:
+        """按规范化查询精确匹配，未命中返回None"""
+        self._expire(version)
+
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        self._entries.move_to_end(key)
+        self.exact_hits += 1
+        self.saved_seconds += entry.cost
+        return entry.value
+
+    def get_similar(self, key: Tuple, version: str, embedding: List[float]) -> Optional[Any]:
+        """按查询向量相似度匹配参数相同的近似查询，未启用或未命中返回None"""
+        if self.similarity_threshold is None:
+            return None
+        self._expire(version)
+
+        similar_key = self._find_similar(key[1:], np.asarray(embedding, dtype=np.float32))
+        if similar_key is None:
+            return None
+
+        entry = self._entries[similar_key]
+        self._entries.move_to_end(similar_key)
+        self.similar_hits += 1
+        self.saved_seconds += entry.cost
+        return entry.value
+
+    def put(self, key: Tuple, value: Any, version: str, cost: float, embedding: Optional[List[float]] = None):
+        """写入未命中的检索结果，cost为本次实际检索耗时，用于统计节省的时间"""
+        self.misses += 1
+
+        vector = None
+        if embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm:
+                vector = vector / norm
+
+        self._entries[key] = _RetrievalEntry(value, version, time.monotonic(), cost, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _expire(self, version: str):
+        """清除过期或版本不一致的条目"""
+        now = time.monotonic()
+        stale = [
+            key for key, entry in self._entries.items()
+            if entry.version != version or now - entry.created_at > self.ttl
+        ]
+        for key in stale:
+            del self._entries[key]
+
+    def _find_similar(self, params: Tuple, embedding: np.ndarray) -> Optional[Tuple]:
+        """在参数相同的条目中查找余弦相似度最高且超过阈值的查询"""
+        candidates = [
+            (key, entry.embedding) for key, entry in self._entries.items()
+            if key[1:] == params and entry.embedding is not None
+        ]
+        if not candidates:
+            return None
+
+        norm = np.linalg.norm(embedding)
+        if not norm:
+            return None
+
+        matrix = np.stack([vector for _, vector in candidates])
+        similarities = matrix @ (embedding / norm)
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.similarity_threshold:
+            return candidates[best][0]
+        return None
+
+    def clear(self):
+        """清空缓存"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """缓存命中统计"""
+        hits = self.exact_hits + self.similar_hits
+        total = hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "entries": len(self._entries),
+        }
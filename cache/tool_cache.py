@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from langchain_core.tools import BaseTool, StructuredTool
+
+from cache.embedding_cache import normalize_text
+
+
+def _normalize_args(value: Any) -> Any:
+    """规范化工具参数：字符串折叠空白，字典按键排序"""
+    if isinstance(value, str):
+        return normalize_text(value)
+    if isinstance(value, dict):
+        return {key: _normalize_args(value[key]) for key in sorted(value)}
+    if isinstance(value, (list, tuple)):
+        return [_normalize_args(item) for item in value]
+    return value
+
+
+class ToolResultCache:
+    """工具调用结果缓存：LRU容量上限 + 按工具配置TTL，并发的相同调用合并为一次请求"""
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, float]]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+        )
+
+    @staticmethod
+    def make_key(tool_name: str, arguments: Dict[str, Any]) -> Tuple[str, str]:
+        """生成缓存键：工具名 + 规范化参数"""
+        return tool_name, json.dumps(_normalize_args(arguments), ensure_ascii=False, sort_keys=True)
+
+    async def get_or_call(
+            self,
+            tool_name: str,
+            arguments: Dict[str, Any],
+            ttl: float,
+            factory: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """命中缓存直接返回；已有相同调用在途时等待其结果；否则执行调用并缓存成功结果"""
+        key = self.make_key(tool_name, arguments)
+        stats = self._stats[tool_name]
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                stats["hits"] += 1
+                return value
+            del self._entries[key]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            stats["coalesced"] += 1
+            return await asyncio.shield(task)
+
+        stats["misses"] += 1
+        task = asyncio.ensure_future(factory())
+        self._in_flight[key] = task
+
+        def on_done(done: asyncio.Task):
+            self._in_flight.pop(key, None)
+            if done.cancelled() or done.exception() is not None:
+                stats["errors"] += 1
+                return
+            self._entries[key] = (done.result(), time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        task.add_done_callback(on_done)
+        # 发起者被取消时不影响正在等待同一结果的其他调用
+        return await asyncio.shield(task)
+
+    def stats(self, tool_name: str) -> Dict[str, Any]:
+        """获取单个工具的缓存统计"""
+        stats = dict(self._stats[tool_name])
+        total = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / total if total else 0.0
+        stats["entries"] = sum(1 for name, _ in self._entries if name == tool_name)
+        return stats
+
+
+def cache_tool(tool: BaseTool, cache: ToolResultCache, ttl: float) -> BaseTool:
+    """为工具包装结果缓存，保持原有的名称、描述与参数定义"""
+
+    async def call(**arguments) -> Any:
+        return await cache.get_or_call(tool.name, arguments, ttl, lambda: tool.ainvoke(arguments))
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=call,
+        metadata=tool.metadata,
+    )
@@ -0,0 +1,215 @@
+import asyncio
+import glob
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SNAPSHOT_PREFIX = "replica-"
+
+
+@dataclass
+class _Snapshot:
+    """某一集合版本的只读副本：内存映射的float32向量矩阵 + 文档与元数据"""
+    version: Optional[str] = None
+    ids: List[str] = field(default_factory=list)
+    documents: List[str] = field(default_factory=list)
+    metadatas: List[Dict[str, Any]] = field(default_factory=list)
+    matrix: np.ndarray = field(default_factory=lambda: np.empty((0, 0), dtype=np.float32))
+    norms_sq: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float32))
+
+
+class VectorReplica:
+    """Chroma集合的进程内只读副本，查询时直接在向量矩阵上做精确的top-k检索
+
+    每个集合版本保存为一组快照文件（.npy向量矩阵 + .json文档与元数据），向量矩阵以内存映射方式加载，
+    多个worker共享页缓存。同步时只从Chroma拉取新增的切块（切块ID由内容与元数据哈希生成），删除的切块直接丢弃
+    """
+
+    def __init__(self, path: str, batch_size: int = 1000):
+        self.path = path
+        self.batch_size = batch_size
+        self._snapshot = _Snapshot()
+        self.stats = {
+            "syncs": 0,
+            "last_sync_seconds": None,
+            "last_sync_added": 0,
+            "last_sync_removed": 0,
+            "queries": 0,
+        }
+        os.makedirs(path, exist_ok=True)
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._snapshot.version
+
+    def load_latest(self) -> bool:
+        """加载磁盘上最新的完整快照，作为增量同步的基础"""
+        metas = glob.glob(os.path.join(self.path, f"{SNAPSHOT_PREFIX}*.json"))
+        for meta_path in sorted(metas, key=os.path.getmtime, reverse=True):
+            try:
+                self._snapshot = self._read(meta_path)
+                return True
+            except (OSError, ValueError, KeyError):
+                continue
+        return False
+
+    def load_version(self, version: str) -> bool:
+        """加载指定版本的快照（可能已由其他worker同步完成）"""
+        meta_path = self._snapshot_path(version) + ".json"
+        if not os.path.exists(meta_path):
+            return False
+        try:
+            self._snapshot = self._read(meta_path)
+            return True
+        except (OSError, ValueError, KeyError):
+            return False
+
+    async def sync(self, async_collection, version: str):
+        """从Chroma增量同步到指定版本：只拉取本地没有的切块"""
+        start = time.perf_counter()
+        base = self._snapshot
+        remote_ids = (await async_collection.get(include=[]))["ids"]
+
+        local_rows = {chunk_id: row for row, chunk_id in enumerate(base.ids)}
+        remote_set = set(remote_ids)
+        kept_rows = [row for row, chunk_id in enumerate(base.ids) if chunk_id in remote_set]
+        added_ids = [chunk_id for chunk_id in remote_ids if chunk_id not in local_rows]
+
+        added_embeddings, added_documents, added_metadatas = [], [], []
+        for offset in range(0, len(added_ids), self.batch_size):
+            batch = await async_collection.get(
+                ids=added_ids[offset:offset + self.batch_size],
+                include=["embeddings", "documents", "metadatas"]
+            )
+            # 按返回的ID顺序对齐，Chroma不保证与请求顺序一致
+            order = {chunk_id: index for index, chunk_id in enumerate(batch["ids"])}
+            for chunk_id in added_ids[offset:offset + self.batch_size]:
+                index = order[chunk_id]
+                added_embeddings.append(np.asarray(batch["embeddings"][index], dtype=np.float32))
+                added_documents.append(batch["documents"][index] or "")
+                added_metadatas.append(batch["metadatas"][index] or {})
+
+        snapshot = await asyncio.to_thread(
+            self._build, base, version, kept_rows, added_ids, added_embeddings, added_documents, added_metadatas
+        )
+        self._snapshot = snapshot
+
+        self.stats["syncs"] += 1
+        self.stats["last_sync_seconds"] = round(time.perf_counter() - start, 3)
+        self.stats["last_sync_added"] = len(added_ids)
+        self.stats["last_sync_removed"] = len(base.ids) - len(kept_rows)
+
+    def query(self, embedding: List[float], k: int, metric: str) -> List[Tuple[str, Dict[str, Any], float]]:
+        """精确top-k检索，返回(文档, 元数据, 距离)，距离与Chroma对应度量的定义一致"""
+        snapshot = self._snapshot
+        if not snapshot.ids:
+            return []
+
+        self.stats["queries"] += 1
+        query = np.asarray(embedding, dtype=np.float32)
+        dots = snapshot.matrix @ query
+
+        if metric == "cosine":
+            norms = np.sqrt(snapshot.norms_sq) * np.linalg.norm(query)
+            distances = 1.0 - dots / np.maximum(norms, 1e-12)
+        elif metric == "ip":
+            distances = 1.0 - dots
+        else:
+            distances = snapshot.norms_sq + float(query @ query) - 2.0 * dots
+
+        k = min(k, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [
+            (snapshot.documents[row], snapshot.metadatas[row], float(distances[row]))
+            for row in top
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version,
+            "count": len(snapshot.ids),
+            "dimension": int(snapshot.matrix.shape[1]) if snapshot.ids else None,
+            **self.stats,
+        }
+
+    def _snapshot_path(self, version: str) -> str:
+        name = re.sub(r"[^0-9A-Za-z_.-]", "_", version) or "initial"
+        return os.path.join(self.path, f"{SNAPSHOT_PREFIX}{name}")
+
+    def _build(
+            self,
+            base: _Snapshot,
+            version: str,
+            kept_rows: List[int],
+            added_ids: List[str],
+            added_embeddings: List[np.ndarray],
+            added_documents: List[str],
+            added_metadatas: List[Dict[str, Any]]
+    ) -> _Snapshot:
+        """合并保留与新增的切块，写入新版本快照并以内存映射方式重新加载"""
+        parts = []
+        if kept_rows:
+            parts.append(np.asarray(base.matrix[kept_rows], dtype=np.float32))
+        if added_embeddings:
+            parts.append(np.vstack(added_embeddings))
+        matrix = np.ascontiguousarray(np.vstack(parts)) if parts else np.empty((0, 0), dtype=np.float32)
+
+        meta = {
+            "version": version,
+            "ids": [base.ids[row] for row in kept_rows] + added_ids,
+            "documents": [base.documents[row] for row in kept_rows] + added_documents,
+            "metadatas": [base.metadatas[row] for row in kept_rows] + added_metadatas,
+        }
+
+        # 先写向量矩阵再写元数据，元数据文件存在即表示快照完整；临时文件名带进程号，避免多个worker互相覆盖
+        target = self._snapshot_path(version)
+        suffix = f".{os.getpid()}.tmp"
+        with open(target + ".npy" + suffix, "wb") as f:
+            np.save(f, matrix)
+        os.replace(target + ".npy" + suffix, target + ".npy")
+        with open(target + ".json" + suffix, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(target + ".json" + suffix, target + ".json")
+
+        self._remove_stale(target)
+        return self._read(target + ".json")
+
+    def _remove_stale(self, keep: str):
+        """删除其他版本的快照，跳过其他worker正在写入的临时文件，文件仍被映射时（Windows）忽略失败"""
+        for path in glob.glob(os.path.join(self.path, f"{SNAPSHOT_PREFIX}*")):
+            if not path.startswith(keep + ".") and not path.endswith(".tmp"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _read(meta_path: str) -> _Snapshot:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        ids = meta["ids"]
+        if ids:
+            matrix = np.load(meta_path[:-len(".json")] + ".npy", mmap_mode="r")
+            if matrix.shape[0] != len(ids):
+                raise ValueError(f"快照向量数与切块数不一致: {meta_path}")
+            norms_sq = np.einsum("ij,ij->i", matrix, matrix)
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+            norms_sq = np.empty(0, dtype=np.float32)
+
+        return _Snapshot(
+            version=meta["version"],
+            ids=ids,
+            documents=meta["documents"],
+            metadatas=meta["metadatas"],
+            matrix=matrix,
+            norms_sq=norms_sq,
+        )
@@ -1,3 +1,5 @@
+from typing import Any, Dict, List, Optional
+
 from pydantic_settings import BaseSettings
 
 
@@ -6,23 +8,131 @@ class Settings(BaseSettings):
 
     # 数据库配置
     db_uri: str
+    # checkpoint存储，可选 postgres / memory（memory仅用于本地测试与基准测试）
+    checkpointer_backend: str = "postgres"
+    # checkpoint序列化：较大的数据使用zstd压缩，超过长度阈值的工具输出按内容哈希外置存储（为空时不外置）
+    # 两项配置只影响写入，读取时始终兼容压缩、未压缩与外置的数据，可以随时开启或关闭
+    checkpoint_compression_enabled: bool = True
+    checkpoint_compression_level: int = 3
+    checkpoint_compression_min_bytes: int = 512
+    checkpoint_side_storage_min_chars: Optional[int] = 4096
+    # 每个worker的连接池大小，数据库总连接数为 workers × db_pool_max_size
+    db_pool_min_size: int = 4
+    db_pool_max_size: Optional[int] = None
 
     # LLM配置
     llm_model: str
     llm_base_url: str
     llm_api_key: str
+    # 单次LLM调用超时（秒）
+    llm_timeout: float = 60.0
+
+    # Agent运行准入控制：全局并发上限、排队上限与排队超时
+    agent_max_concurrent_runs: int = 8
+    agent_max_queued_runs: int = 32
+    agent_queue_timeout: float = 30.0
+    agent_retry_after: int = 5
+
+    # Agent运行预算：每轮对话的默认时间预算与上限（秒，含排队）、为最终回答预留的时间、最大模型调用步数
+    agent_deadline: float = 120.0
+    agent_max_deadline: float = 600.0
+    agent_answer_reserve: float = 15.0
+    agent_max_steps: int = 8
+
+    # LLM响应缓存配置，llm_cache_backend可选 postgres / sqlite，为空时不启用
+    llm_cache_backend: Optional[str] = None
+    llm_cache_ttl: float = 86400.0
+    llm_cache_max_entries: int = 10000
+    llm_cache_path: str = "./.cache/llm_cache.sqlite3"
+    llm_cache_tool_calls: bool = False
+
+    # 批量聊天配置
+    batch_default_concurrency: int = 4
+    batch_max_concurrency: int = 8
+    batch_max_items: int = 1000
+
+    # 客户端断开检测间隔与SSE心跳间隔（秒），心跳防止反向代理因空闲断开连接
+    disconnect_check_interval: float = 1.0
+    sse_heartbeat_interval: float = 15.0
+
+    # 上下文管理配置，context_max_tokens为空时发送完整历史
+    context_max_tokens: Optional[int] = 8000
+    context_recent_tokens: int = 4000
+
+    # MCP配置：延迟启动的服务器在首次调用时才启动进程
+    mcp_enabled: bool = True
+    mcp_lazy_servers: List[str] = []
+    mcp_tool_schema_cache_path: str = "./.cache/mcp_tools.json"
+    mcp_ping_interval: float = 30.0
+    mcp_ping_timeout: float = 2.0
+
+    # 工具结果缓存配置，按工具名配置TTL（秒），未配置的工具不缓存
+    tool_cache_enabled: bool = True
+    tool_cache_size: int = 512
+    tool_cache_ttls: Dict[str, float] = {"duckduckgo_results_json": 600.0, "fetch": 1800.0}
+    # 工具超时（秒），tool_timeouts按工具名覆盖默认值
+    tool_timeout: float = 30.0
+    tool_timeouts: Dict[str, float] = {"duckduckgo_results_json": 15.0, "fetch": 20.0}
 
     # Embedding配置
     embedding_model: str
+    embedding_base_url: str = "http://localhost:11434"
+    embedding_max_workers: int = 4
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "./.cache/embeddings.sqlite3"
+    embedding_cache_memory_size: int = 10000
+    embedding_cache_max_bytes: int = 512 * 1024 * 1024
 
     # Chroma配置
     chroma_host: str
     chroma_port: int
     collection_name: str
 
+    # 检索配置
+    retrieval_k: int = 3
+    # 先取较多的候选切块，合并相邻切块、去除近似重复后在token预算内组装上下文
+    retrieval_candidate_k: int = 12
+    retrieval_context_max_tokens: int = 1500
+    retrieval_dedup_threshold: float = 0.9
+    retrieval_score_threshold: float = 0.0
+    retrieval_cache_enabled: bool = True
+    retrieval_cache_size: int = 1024
+    retrieval_cache_ttl: float = 300.0
+    # 近似查询匹配的余弦相似度阈值，为空时只做精确匹配
+    retrieval_cache_similarity_threshold: Optional[float] = None
+    retrieval_version_check_interval: float = 5.0
+    # 推测式知识库预取：与首次模型调用并行检索用户消息，模型随后请求相近的查询时直接复用结果
+    retrieval_prefetch_enabled: bool = False
+    retrieval_prefetch_similarity: float = 0.85
+    # 进程内向量副本：在本地内存映射的向量矩阵上检索，跳过Chroma的HTTP调用，版本变化时增量同步
+    vector_replica_enabled: bool = False
+    vector_replica_path: str = "./.cache/vector_replica"
+    vector_replica_sync_batch_size: int = 1000
+
+    # checkpoint保留策略配置
+    checkpoint_retention_enabled: bool = False
+    checkpoint_retention_interval: float = 3600.0
+    checkpoint_retention_keep_last: Optional[int] = 20
+    checkpoint_retention_max_age_days: Optional[float] = None
+    checkpoint_retention_idle_days: Optional[float] = None
+    # 按thread_id通配符覆盖默认策略，如 {"eval-*": {"keep_last": 1, "idle_days": 1}}
+    checkpoint_retention_overrides: Dict[str, Dict[str, Any]] = {}
+    checkpoint_retention_batch_size: int = 100
+    checkpoint_retention_batch_pause: float = 0.5
+
+    # 就绪检查配置
+    readiness_check_timeout: float = 2.0
+    readiness_cache_ttl: float = 2.0
+    readiness_pool_saturation: float = 0.9
+
     # 服务配置
     port: int = 8080
     log_level: str = "info"
+    # worker进程数，大于1时以多进程方式运行，指标写入prometheus_multiproc_dir汇总
+    workers: int = 1
+    # 收到退出信号后等待进行中请求完成的最长时间（秒）
+    shutdown_drain_timeout: float = 30.0
+    prometheus_multiproc_dir: str = "./.cache/prometheus"
 
     class Config:
         # 从.env文件读取环境变量
@@ -1,5 +1,10 @@
 __all__ = [
+    "CompressedSerializer",
+    "DrainingServer",
+    "SideStoragePostgresSaver",
     "lifespan"
 ]
 
+from .checkpointer import CompressedSerializer, SideStoragePostgresSaver
 from .lifespan import lifespan
+from .server import DrainingServer
@@ -0,0 +1,272 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import zstandard
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+# 压缩后的类型标记后缀，未带后缀的旧数据按原格式读取
+ZSTD_SUFFIX = "+zstd"
+# 外部存储的工具输出在消息中的引用前缀
+BLOB_REF_PREFIX = "\x00checkpoint-blob:sha256:"
+MISSING_BLOB_CONTENT = "[工具输出已被清理]"
+# 在序列化数据中查找引用（json格式会把前缀中的\x00转义，因此不匹配该字符）
+_BLOB_REF_PATTERN = re.compile(re.escape(BLOB_REF_PREFIX[1:].encode("utf-8")) + rb"([0-9a-f]{64})")
+
+_CREATE_SIDE_BLOBS_SQL = """
+CREATE TABLE IF NOT EXISTS checkpoint_side_blobs (
+    thread_id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    blob BYTEA NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (thread_id, hash)
+)
+"""
+_ADD_UPDATED_AT_SQL = (
+    "ALTER TABLE checkpoint_side_blobs ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now()"
+)
+
+
+def referenced_blob_hashes(rows: Iterable[Tuple[str, Optional[bytes]]]) -> Set[str]:
+    """扫描序列化后的(类型, 数据)，返回其中引用的外置内容哈希，压缩的数据先解压"""
+    decompressor = zstandard.ZstdDecompressor()
+    hashes = set()
+    for type_, data in rows:
+        if data is None:
+            continue
+        data = bytes(data)
+        if type_ and type_.endswith(ZSTD_SUFFIX):
+            data = decompressor.decompress(data)
+        hashes.update(match.decode("ascii") for match in _BLOB_REF_PATTERN.findall(data))
+    return hashes
+
+
+class CompressedSerializer(SerializerProtocol):
+    """在默认序列化器（msgpack）之上对较大的数据做zstd压缩
+
+    压缩后的类型标记为 "<原类型>+zstd"，读取时根据标记判断，新旧格式可以共存；
+    enabled只控制写入，关闭后仍能读取之前压缩写入的数据
+    """
+
+    def __init__(
+            self,
+            level: int = 3,
+            min_bytes: int = 512,
+            inner: Optional[SerializerProtocol] = None,
+            enabled: bool = True
+    ):
+        self.level = level
+        self.min_bytes = min_bytes
+        self.enabled = enabled
+        self.inner = inner or JsonPlusSerializer()
+        # zstd上下文不能跨线程共享
+        self._local = threading.local()
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.inner.dumps_typed(obj)
+        if not self.enabled or len(data) < self.min_bytes:
+            return type_, data
+        return type_ + ZSTD_SUFFIX, self._compressor().compress(data)
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.endswith(ZSTD_SUFFIX):
+            type_ = type_[:-len(ZSTD_SUFFIX)]
+            payload = self._decompressor().decompress(payload)
+        return self.inner.loads_typed((type_, payload))
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor().compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor().decompress(data)
+
+    def _compressor(self) -> zstandard.ZstdCompressor:
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._local.compressor = zstandard.ZstdCompressor(level=self.level)
+        return compressor
+
+    def _decompressor(self) -> zstandard.ZstdDecompressor:
+        decompressor = getattr(self._local, "decompressor", None)
+        if decompressor is None:
+            decompressor = self._local.decompressor = zstandard.ZstdDecompressor()
+        return decompressor
+
+
+class SideStoragePostgresSaver(AsyncPostgresSaver):
+    """将大的工具输出按内容哈希存入独立的表，checkpoint中只保存引用
+
+    messages通道每一步都会完整写入，工具输出外置后同一段内容在一个会话中只写入一次；
+    读取checkpoint时批量取回并还原引用。min_chars为空时不再外置新的输出，之前外置的内容仍可读取
+    """
+
+    def __init__(self, conn, serde: CompressedSerializer, min_chars: Optional[int], cache_size: int = 256):
+        super().__init__(conn, serde=serde)
+        self.compressor = serde
+        self.min_chars = min_chars
+        self.cache_size = cache_size
+        self._blob_cache: "OrderedDict[str, str]" = OrderedDict()
+
+    async def setup(self) -> None:
+        await super().setup()
+        async with self._cursor() as cur:
+            await cur.execute(_CREATE_SIDE_BLOBS_SQL)
+            await cur.execute(_ADD_UPDATED_AT_SQL)
+
+    async def aput(
+            self,
+            config: RunnableConfig,
+            checkpoint: Checkpoint,
+            metadata: CheckpointMetadata,
+            new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        blobs: Dict[str, str] = {}
+        channel_values = {
+            channel: self._externalize(value, blobs) if channel in new_versions else value
+            for channel, value in checkpoint["channel_values"].items()
+        }
+        await self._store_blobs(config["configurable"]["thread_id"], blobs)
+        return await super().aput(config, {**checkpoint, "channel_values": channel_values}, metadata, new_versions)
+
+    async def aput_writes(
+            self,
+            config: RunnableConfig,
+            writes: Sequence[Tuple[str, Any]],
+            task_id: str,
+            task_path: str = ""
+    ) -> None:
+        blobs: Dict[str, str] = {}
+        writes = [(channel, self._externalize(value, blobs)) for channel, value in writes]
+        await self._store_blobs(config["configurable"]["thread_id"], blobs)
+        await super().aput_writes(config, writes, task_id, task_path)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        checkpoint_tuple = await super().aget_tuple(config)
+        if checkpoint_tuple:
+            await self._resolve(checkpoint_tuple)
+        return checkpoint_tuple
+
+    async def alist(
+            self,
+            config: Optional[RunnableConfig],
+            *,
+            filter: Optional[Dict[str, Any]] = None,
+            before: Optional[RunnableConfig] = None,
+            limit: Optional[int] = None
+    ) -> AsyncIterator[CheckpointTuple]:
+        async for checkpoint_tuple in super().alist(config, filter=filter, before=before, limit=limit):
+            await self._resolve(checkpoint_tuple)
+            yield checkpoint_tuple
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await super().adelete_thread(thread_id)
+        async with self._cursor() as cur:
+            await cur.execute("DELETE FROM checkpoint_side_blobs WHERE thread_id = %s", (str(thread_id),))
+
+    def _externalize(self, value: Any, blobs: Dict[str, str]) -> Any:
+        """将大的工具输出替换为内容哈希引用，返回新对象，不修改运行中的状态"""
+        if isinstance(value, ToolMessage):
+            content = value.content
+            if (
+                    self.min_chars
+                    and isinstance(content, str)
+                    and len(content) >= self.min_chars
+                    and not content.startswith(BLOB_REF_PREFIX)
+            ):
+                digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+                blobs[digest] = content
+                return value.model_copy(update={"content": BLOB_REF_PREFIX + digest})
+            return value
+        if type(value) in (list, tuple):
+            items = [self._externalize(item, blobs) for item in value]
+            if any(new is not old for new, old in zip(items, value)):
+                return type(value)(items)
+            return value
+        if type(value) is dict:
+            items = {key: self._externalize(item, blobs) for key, item in value.items()}
+            if any(items[key] is not value[key] for key in value):
+                return items
+            return value
+        return value
+
+    async def _store_blobs(self, thread_id: str, blobs: Dict[str, str]):
+        """写入外置内容：数据库中已有的只刷新更新时间（清理时据此跳过仍在使用的内容），缺失的才上传
+
+        每次都以数据库为准，不记录本进程写过哪些内容：其他worker可能已删除该会话的外置内容
+        """
+        if not blobs:
+            return
+
+        thread_id = str(thread_id)
+        async with self._cursor() as cur:
+            await cur.execute(
+                "UPDATE checkpoint_side_blobs SET updated_at = now() WHERE thread_id = %s AND hash = ANY(%s) "
+                "RETURNING hash",
+                (thread_id, list(blobs))
+            )
+            existing = {row["hash"] for row in await cur.fetchall()}
+            new = [(digest, content) for digest, content in blobs.items() if digest not in existing]
+            if new:
+                await cur.executemany(
+                    "INSERT INTO checkpoint_side_blobs (thread_id, hash, blob) VALUES (%s, %s, %s) "
+                    "ON CONFLICT (thread_id, hash) DO UPDATE SET updated_at = now()",
+                    [(thread_id, digest, self.compressor.compress(content.encode("utf-8"))) for digest, content in new]
+                )
+        for digest, content in new:
+            self._remember(self._blob_cache, digest, content, self.cache_size)
+
+    async def _resolve(self, checkpoint_tuple: CheckpointTuple):
+        """还原checkpoint与待写入数据中的外置内容引用"""
+        messages: List[ToolMessage] = []
+        self._collect_refs(checkpoint_tuple.checkpoint.get("channel_values", {}), messages)
+        for _, _, value in checkpoint_tuple.pending_writes or []:
+            self._collect_refs(value, messages)
+        if not messages:
+            return
+
+        digests = {message.content[len(BLOB_REF_PREFIX):] for message in messages}
+        contents = await self._load_blobs(checkpoint_tuple.config["configurable"]["thread_id"], digests)
+        for message in messages:
+            message.content = contents.get(message.content[len(BLOB_REF_PREFIX):], MISSING_BLOB_CONTENT)
+
+    def _collect_refs(self, value: Any, messages: List[ToolMessage]):
+        if isinstance(value, ToolMessage):
+            if isinstance(value.content, str) and value.content.startswith(BLOB_REF_PREFIX):
+                messages.append(value)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                self._collect_refs(item, messages)
+        elif isinstance(value, dict):
+            for item in value.values():
+                self._collect_refs(item, messages)
+
+    async def _load_blobs(self, thread_id: str, digests: Set[str]) -> Dict[str, str]:
+        contents = {digest: self._blob_cache[digest] for digest in digests if digest in self._blob_cache}
+        missing = [digest for digest in digests if digest not in contents]
+        if missing:
+            async with self._cursor() as cur:
+                await cur.execute(
+                    "SELECT hash, blob FROM checkpoint_side_blobs WHERE thread_id = %s AND hash = ANY(%s)",
+                    (str(thread_id), missing)
+                )
+                rows = await cur.fetchall()
+            for row in rows:
+                content = self.compressor.decompress(bytes(row["blob"])).decode("utf-8")
+                contents[row["hash"]] = content
+                self._remember(self._blob_cache, row["hash"], content, self.cache_size)
+        return contents
+
+    @staticmethod
+    def _remember(cache: OrderedDict, key: Any, value: Any, limit: int):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > limit:
+            cache.popitem(last=False)
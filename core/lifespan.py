@@ -1,10 +1,15 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
 
+from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from psycopg_pool import AsyncConnectionPool
 
+import service
 from config import settings
-from service import AgentService, ChatService, VectorStoreService
+from core.checkpointer import CompressedSerializer, SideStoragePostgresSaver
+from core.startup import StartupTimer
+from monitoring import mark_worker_dead, register_pool_collector, unregister_pool_collector
 
 
 class ApplicationState:
@@ -15,37 +20,103 @@ class ApplicationState:
         self.agent_service = None
         self.chat_service = None
         self.checkpointer = None
+        self.retention_service = None
+        self.health_service = None
+
+
+def create_postgres_checkpointer(pool: AsyncConnectionPool) -> AsyncPostgresSaver:
+    """创建Postgres checkpointer
+
+    读取时始终能解压zstd数据并还原外置的工具输出，配置只决定写入时是否压缩、是否外置，
+    关闭这两项后之前写入的数据仍可正常读取
+    """
+    serde = CompressedSerializer(
+        level=settings.checkpoint_compression_level,
+        min_bytes=settings.checkpoint_compression_min_bytes,
+        enabled=settings.checkpoint_compression_enabled
+    )
+    return SideStoragePostgresSaver(pool, serde, settings.checkpoint_side_storage_min_chars)
 
 
 @asynccontextmanager
 async def lifespan(app):
-    """应用生命周期管理"""
-    # 初始化阶段
-    connection_kwargs = {
-        "autocommit": True,
-        "prepare_threshold": 0,
-    }
-
-    async with AsyncConnectionPool(settings.db_uri, kwargs=connection_kwargs) as pool:
-        # 创建checkpointer
-        checkpointer = AsyncPostgresSaver(pool)
-        await checkpointer.setup()
-
-        # 初始化服务
-        vector_store_service = VectorStoreService()
-        await vector_store_service.initialize()
+    """应用生命周期管理
+
+    相互独立的初始化步骤并行执行：服务模块在线程中导入，同时初始化checkpointer；
+    随后向量存储初始化、MCP工具发现与checkpointer建表并行进行，最后构建Agent
+    """
+    async with AsyncExitStack() as stack:
+        stack.callback(mark_worker_dead)
+        timer = StartupTimer()
+
+        # 初始化阶段：重量级模块（langchain_community、chromadb、OpenAI客户端等）在线程中导入
+        services_imported = asyncio.create_task(timer.measure("imports", asyncio.to_thread(service.preload)))
+
+        pool = None
+        checkpointer_ready = None
+        if settings.checkpointer_backend == "memory":
+            # 内存checkpointer：进程退出后历史丢失，仅用于本地测试与基准测试
+            checkpointer = InMemorySaver()
+        else:
+            connection_kwargs = {
+                "autocommit": True,
+                "prepare_threshold": 0,
+            }
+            # 每个worker拥有独立的连接池
+            pool = await stack.enter_async_context(AsyncConnectionPool(
+                settings.db_uri,
+                min_size=settings.db_pool_min_size,
+                max_size=settings.db_pool_max_size,
+                kwargs=connection_kwargs
+            ))
 
+            # 创建checkpointer
+            checkpointer = create_postgres_checkpointer(pool)
+            checkpointer_ready = asyncio.create_task(timer.measure("checkpointer_setup", checkpointer.setup()))
+
+            # 连接池指标
+            stack.callback(unregister_pool_collector, register_pool_collector(pool))
+
+        await services_imported
+        from service import AgentService, ChatService, CheckpointRetentionService, HealthService, VectorStoreService
+
+        # 初始化服务，失败时同样关闭已启动的MCP会话与线程池
+        vector_store_service = VectorStoreService()
+        stack.push_async_callback(vector_store_service.close)
         agent_service = AgentService(checkpointer, vector_store_service)
-        await agent_service.initialize()
+        stack.push_async_callback(agent_service.close)
 
-        chat_service = ChatService(agent_service, checkpointer)
+        await asyncio.gather(
+            timer.measure("vector_store", vector_store_service.initialize()),
+            timer.measure("mcp_discovery", agent_service.discover_mcp_tools()),
+            *([checkpointer_ready] if checkpointer_ready else [])
+        )
+        # LLM缓存可能使用Postgres，Agent构建需要在checkpointer就绪之后
+        await timer.measure("agent", agent_service.initialize())
+
+        chat_service = ChatService(agent_service, checkpointer, pool)
 
         # 保存到应用状态
         app.state.vector_store_service = vector_store_service
         app.state.agent_service = agent_service
         app.state.chat_service = chat_service
         app.state.checkpointer = checkpointer
+        app.state.health_service = HealthService(pool, vector_store_service, agent_service, chat_service)
+
+        # 后台checkpoint清理任务：每个worker都会启动，由数据库advisory lock保证同一时间只有一个worker执行清理
+        retention_task = None
+        if pool is not None:
+            retention_service = CheckpointRetentionService(pool)
+            app.state.retention_service = retention_service
+            if settings.checkpoint_retention_enabled:
+                retention_task = asyncio.create_task(retention_service.run_forever())
+
+        app.state.startup_report = timer.finish()
 
         yield
 
-        # 清理阶段（连接池会自动关闭）
+        # 清理阶段（Agent、向量存储与连接池由exit stack依次关闭）
+        if retention_task:
+            retention_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await retention_task
@@ -0,0 +1,15 @@
+import uvicorn
+
+from service import shutdown_state
+
+
+class DrainingServer(uvicorn.Server):
+    """收到SIGTERM/SIGINT时先进入排空阶段再交给uvicorn优雅停机
+
+    uvicorn随后停止监听、等待进行中的请求（含SSE流）在timeout_graceful_shutdown内完成，
+    超时后取消剩余请求并执行lifespan清理
+    """
+
+    def handle_exit(self, sig, frame):
+        shutdown_state.begin_drain()
+        super().handle_exit(sig, frame)
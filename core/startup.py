@@ -0,0 +1,38 @@
+import logging
+import time
+from typing import Any, Awaitable, Dict, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """记录启动各阶段的耗时，并行执行的阶段各自计时"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.total_seconds = None
+
+    async def measure(self, name: str, awaitable: Awaitable[T]) -> T:
+        """等待一个启动步骤并记录耗时"""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.phases[name] = round(time.perf_counter() - start, 3)
+
+    def finish(self) -> Dict[str, Any]:
+        """结束计时并输出启动报告"""
+        self.total_seconds = round(time.perf_counter() - self.started, 3)
+        report = self.report()
+        logger.info(
+            "启动完成，总耗时 %.3fs（%s）",
+            self.total_seconds,
+            "，".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases.items())
+        )
+        return report
+
+    def report(self) -> Dict[str, Any]:
+        return {"total_seconds": self.total_seconds, "phases": dict(self.phases)}
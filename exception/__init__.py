@@ -1,11 +1,15 @@
 __all__ = [
     "ServiceException",
     "AgentNotInitializedException",
+    "AgentBusyException",
+    "ServiceDrainingException",
     "VectorStoreNotInitializedException"
 ]
 
 from .exception import (
+    AgentBusyException,
     AgentNotInitializedException,
+    ServiceDrainingException,
     ServiceException,
     VectorStoreNotInitializedException,
 )
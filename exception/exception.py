@@ -1,9 +1,10 @@
 class ServiceException(Exception):
     """服务异常基类"""
 
-    def __init__(self, status_code: int = 500, message: str = "服务异常"):
+    def __init__(self, status_code: int = 500, message: str = "服务异常", headers: dict = None):
         self.status_code = status_code
         self.message = message
+        self.headers = headers
         super().__init__(self.message)
 
 
@@ -19,3 +20,19 @@ class VectorStoreNotInitializedException(ServiceException):
 
     def __init__(self):
         super().__init__(500, "向量存储未初始化")
+
+
+class AgentBusyException(ServiceException):
+    """Agent运行排队已满异常"""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(429, "服务繁忙，请稍后重试", headers={"Retry-After": str(retry_after)})
+
+
+class ServiceDrainingException(ServiceException):
+    """服务停机排空中异常"""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(503, "服务正在停机，请稍后重试", headers={"Retry-After": str(retry_after)})
@@ -1,20 +1,19 @@
 import asyncio
-import signal
+import os
 import sys
 import threading
 import time
-import webbrowser
 
-import requests
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 from fastapi.staticfiles import StaticFiles
 
-from api import chat, health, tools
+from api import chat, health, metrics, tools
 from config import settings
-from core import lifespan
+from core import DrainingServer, lifespan
+from monitoring import PrometheusMiddleware, prepare_multiprocess_dir
 
 
 def create_app() -> FastAPI:
@@ -35,6 +34,9 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # 请求耗时指标
+    app.add_middleware(PrometheusMiddleware)
+
     # 静态文件服务
     app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -42,6 +44,7 @@ def create_app() -> FastAPI:
     app.include_router(health.router)
     app.include_router(chat.router)
     app.include_router(tools.router)
+    app.include_router(metrics.router)
 
     @app.get("/")
     async def root():
@@ -67,16 +70,14 @@ def check_windows_compatibility() -> bool:
     return True
 
 
-def signal_handler(sig, frame):
-    """关闭信号处理"""
-    print("\n🛑 正在关闭服务器...")
-    sys.exit(0)
-
-
 def open_browser_when_ready():
     """等待服务器就绪后打开浏览器"""
+    import webbrowser
+
+    import requests
+
     url = f"http://localhost:{settings.port}"
-    health_url = f"{url}/health"
+    health_url = f"{url}/health/ready"
 
     max_attempts = 30
     for attempt in range(max_attempts):
@@ -92,30 +93,55 @@ def open_browser_when_ready():
     print("⚠️ 服务器启动超时，请手动访问:", url)
 
 
+def run_server():
+    """启动服务器
+
+    SIGTERM/SIGINT由uvicorn处理：worker进入排空阶段，停止接受新请求，
+    等待进行中的请求与SSE流在shutdown_drain_timeout内完成后再关闭
+    """
+    if settings.workers > 1:
+        from uvicorn.supervisors import Multiprocess
+
+        # 每个worker进程各自执行lifespan，拥有独立的连接池与MCP会话
+        if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            prepare_multiprocess_dir(settings.prometheus_multiproc_dir)
+        config = uvicorn.Config(
+            "main:create_app",
+            factory=True,
+            host="0.0.0.0",
+            port=settings.port,
+            log_level=settings.log_level,
+            workers=settings.workers,
+            timeout_graceful_shutdown=settings.shutdown_drain_timeout
+        )
+        server = DrainingServer(config)
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        config = uvicorn.Config(
+            create_app(),
+            host="0.0.0.0",
+            port=settings.port,
+            log_level=settings.log_level,
+            timeout_graceful_shutdown=settings.shutdown_drain_timeout
+        )
+        DrainingServer(config).run()
+
+
 def main():
     """主函数"""
     # Windows兼容性：设置事件循环策略
     if not check_windows_compatibility():
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-    # 注册信号处理器
-    signal.signal(signal.SIGINT, signal_handler)
-
     # 在后台线程中等待并打开浏览器
     threading.Thread(target=open_browser_when_ready, daemon=True).start()
 
     try:
         # 启动服务器
-        print(f"🚀 正在启动Agent服务器，端口: {settings.port}")
+        print(f"🚀 正在启动Agent服务器，端口: {settings.port}，worker数: {settings.workers}")
         print("💡 按 Ctrl+C 停止服务器")
 
-        app = create_app()
-        uvicorn.run(
-            app,
-            host="0.0.0.0",
-            port=settings.port,
-            log_level=settings.log_level
-        )
+        run_server()
     except KeyboardInterrupt:
         print("\n✅ 服务器已关闭")
 
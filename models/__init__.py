@@ -1,20 +1,29 @@
 __all__ = [
+    "BatchChatItem",
+    "BatchChatRequest",
     "ChatMessage",
     "ChatRequest",
     "ChatResponse",
     "StreamChatRequest",
+    "StreamEventType",
     "ChatHistoryResponse",
     "ToolInfo",
     "ToolsResponse",
-    "HealthResponse"
+    "HealthResponse",
+    "DependencyStatus",
+    "ReadinessResponse",
+    "StartupReport"
 ]
 
 from .chat import (
+    BatchChatItem,
+    BatchChatRequest,
     ChatHistoryResponse,
     ChatMessage,
     ChatRequest,
     ChatResponse,
     StreamChatRequest,
+    StreamEventType,
 )
-from .health import HealthResponse
+from .health import DependencyStatus, HealthResponse, ReadinessResponse, StartupReport
 from .tool import ToolInfo, ToolsResponse
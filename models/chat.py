@@ -1,6 +1,6 @@
 from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class ChatMessage(BaseModel):
@@ -13,6 +13,7 @@ class ChatRequest(BaseModel):
     """聊天请求模型"""
     message: str
     thread_id: Optional[str] = "default"
+    deadline: Optional[float] = Field(None, gt=0, description="本轮对话的时间预算（秒），为空时使用服务端默认值")
 
 
 class ChatResponse(BaseModel):
@@ -25,6 +26,17 @@ class StreamChatRequest(BaseModel):
     """流式聊天请求模型"""
     message: str
     thread_id: Optional[str] = "default"
+    deadline: Optional[float] = Field(None, gt=0, description="本轮对话的时间预算（秒），为空时使用服务端默认值")
+
+
+class StreamEventType:
+    """流式事件类型"""
+    TOKEN = "token"
+    TOOL_CALL_START = "tool_call_start"
+    TOOL_CALL_END = "tool_call_end"
+    BUDGET_EXHAUSTED = "budget_exhausted"
+    FINAL = "final"
+    ERROR = "error"
 
 
 class ChatHistoryResponse(BaseModel):
@@ -37,3 +49,19 @@ class ChatHistoryResponse(BaseModel):
     message: Optional[str] = None
     latest_checkpoint_id: Optional[str] = None
     latest_timestamp: Optional[str] = None
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
+
+class BatchChatItem(BaseModel):
+    """批量聊天条目模型"""
+    message: str
+    thread_id: Optional[str] = None
+    id: Optional[str] = None
+    deadline: Optional[float] = Field(None, gt=0, description="该条目的时间预算（秒），为空时使用服务端默认值")
+
+
+class BatchChatRequest(BaseModel):
+    """批量聊天请求模型"""
+    items: List[BatchChatItem] = Field(min_length=1)
+    concurrency: Optional[int] = Field(default=None, ge=1)
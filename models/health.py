@@ -1,3 +1,5 @@
+from typing import Any, Dict, Optional
+
 from pydantic import BaseModel
 
 
@@ -5,3 +7,26 @@ class HealthResponse(BaseModel):
     """健康信息响应模型"""
     status: str
     message: str
+
+
+class DependencyStatus(BaseModel):
+    """依赖检查结果模型"""
+    status: str
+    critical: bool
+    latency_ms: float
+    detail: Optional[str] = None
+    saturation: Optional[Dict[str, Any]] = None
+
+
+class ReadinessResponse(BaseModel):
+    """就绪检查响应模型"""
+    status: str
+    checked_at: str
+    cached: bool
+    checks: Dict[str, DependencyStatus]
+
+
+class StartupReport(BaseModel):
+    """启动耗时报告模型"""
+    total_seconds: Optional[float] = None
+    phases: Dict[str, float] = {}
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -7,8 +7,10 @@ class ToolInfo(BaseModel):
     """工具信息模型"""
     name: str
     description: str
+    cache_stats: Optional[Dict[str, Any]] = None
 
 
 class ToolsResponse(BaseModel):
     """工具列表响应模型"""
     tools: List[ToolInfo]
+    mcp_servers: Dict[str, Dict[str, Any]] = {}
@@ -0,0 +1,40 @@
+__all__ = [
+    "MetricsCallbackHandler",
+    "PrometheusMiddleware",
+    "get_registry",
+    "mark_worker_dead",
+    "prepare_multiprocess_dir",
+    "register_pool_collector",
+    "unregister_pool_collector",
+    "AGENT_BUDGET_EXHAUSTED",
+    "AGENT_QUEUE_WAIT",
+    "AGENT_RUN_DURATION",
+    "AGENT_RUNS_ACTIVE",
+    "AGENT_RUNS_CANCELLED",
+    "AGENT_RUNS_REJECTED",
+    "AGENT_RUNS_WAITING",
+    "CHROMA_LATENCY",
+    "EMBEDDING_LATENCY",
+    "STREAM_TIME_TO_FIRST_TOKEN",
+    "STREAM_TOKENS_PER_SECOND",
+    "VECTOR_REPLICA_LATENCY"
+]
+
+from .callbacks import MetricsCallbackHandler
+from .metrics import (
+    AGENT_BUDGET_EXHAUSTED,
+    AGENT_QUEUE_WAIT,
+    AGENT_RUN_DURATION,
+    AGENT_RUNS_ACTIVE,
+    AGENT_RUNS_CANCELLED,
+    AGENT_RUNS_REJECTED,
+    AGENT_RUNS_WAITING,
+    CHROMA_LATENCY,
+    EMBEDDING_LATENCY,
+    STREAM_TIME_TO_FIRST_TOKEN,
+    STREAM_TOKENS_PER_SECOND,
+    VECTOR_REPLICA_LATENCY,
+)
+from .middleware import PrometheusMiddleware
+from .multiprocess import get_registry, mark_worker_dead, prepare_multiprocess_dir
+from .pool_collector import register_pool_collector, unregister_pool_collector
@@ -0,0 +1,69 @@
+import time
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from monitoring.metrics import LLM_LATENCY, LLM_TOKENS, TOOL_ERRORS, TOOL_LATENCY
+
+
+class MetricsCallbackHandler(AsyncCallbackHandler):
+    """通过LangChain回调采集LLM与工具调用指标，不侵入业务代码"""
+
+    def __init__(self):
+        self._llm_runs: Dict[UUID, tuple] = {}
+        self._tool_runs: Dict[UUID, tuple] = {}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs: Any):
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name", "unknown")
+        self._llm_runs[run_id] = (model, time.perf_counter())
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        run = self._llm_runs.pop(run_id, None)
+        if not run:
+            return
+        model, start = run
+        LLM_LATENCY.labels(model).observe(time.perf_counter() - start)
+
+        usage = self._usage(response)
+        if usage:
+            LLM_TOKENS.labels(model, "prompt").inc(usage.get("input_tokens", 0))
+            LLM_TOKENS.labels(model, "completion").inc(usage.get("output_tokens", 0))
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._llm_runs.pop(run_id, None)
+
+    @staticmethod
+    def _usage(response: LLMResult) -> Optional[Dict[str, int]]:
+        """读取token用量，流式调用时来自消息的usage_metadata"""
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is not None and getattr(message, "usage_metadata", None):
+                    return message.usage_metadata
+
+        token_usage = (response.llm_output or {}).get("token_usage")
+        if token_usage:
+            return {
+                "input_tokens": token_usage.get("prompt_tokens", 0),
+                "output_tokens": token_usage.get("completion_tokens", 0),
+            }
+        return None
+
+    async def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs: Any):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._tool_runs[run_id] = (name, time.perf_counter())
+
+    async def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        run = self._tool_runs.pop(run_id, None)
+        if run:
+            name, start = run
+            TOOL_LATENCY.labels(name).observe(time.perf_counter() - start)
+
+    async def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        run = self._tool_runs.pop(run_id, None)
+        if run:
+            name, start = run
+            TOOL_LATENCY.labels(name).observe(time.perf_counter() - start)
+            TOOL_ERRORS.labels(name).inc()
@@ -0,0 +1,112 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# 请求延迟
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP请求耗时（流式响应计到最后一个数据块发送完成）",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+
+# 流式聊天
+STREAM_TIME_TO_FIRST_TOKEN = Histogram(
+    "chat_stream_time_to_first_token_seconds",
+    "/chat/stream 从收到请求到推送第一个token的耗时",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 60),
+)
+STREAM_TOKENS_PER_SECOND = Histogram(
+    "chat_stream_tokens_per_second",
+    "/chat/stream 首个token之后的token推送速率",
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250),
+)
+
+# LLM
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds",
+    "单次LLM调用耗时",
+    ["model"],
+    buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 40, 80, 160),
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "LLM消耗的token数量",
+    ["model", "kind"],
+)
+
+# 工具
+TOOL_LATENCY = Histogram(
+    "tool_call_duration_seconds",
+    "工具调用耗时",
+    ["tool"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+TOOL_ERRORS = Counter(
+    "tool_call_errors_total",
+    "工具调用失败次数",
+    ["tool"],
+)
+TOOL_TIMEOUTS = Counter(
+    "tool_call_timeouts_total",
+    "工具调用超时次数",
+    ["tool"],
+)
+
+# 检索
+EMBEDDING_LATENCY = Histogram(
+    "embedding_request_duration_seconds",
+    "查询向量计算耗时（包含缓存命中）",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+CHROMA_LATENCY = Histogram(
+    "chroma_query_duration_seconds",
+    "Chroma向量检索耗时",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+RETRIEVAL_PREFETCH = Counter(
+    "retrieval_prefetch_total",
+    "推测式知识库预取的结果：hit 复用预取结果 / miss 查询不匹配 / unused 模型未调用知识库",
+    ["result"],
+)
+VECTOR_REPLICA_LATENCY = Histogram(
+    "vector_replica_query_duration_seconds",
+    "进程内向量副本检索耗时",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01),
+)
+
+# Agent运行准入控制
+AGENT_RUNS_ACTIVE = Gauge(
+    "agent_runs_active",
+    "正在执行的Agent运行数",
+    multiprocess_mode="livesum",
+)
+AGENT_RUNS_WAITING = Gauge(
+    "agent_runs_waiting",
+    "排队等待执行的Agent运行数",
+    multiprocess_mode="livesum",
+)
+AGENT_QUEUE_WAIT = Histogram(
+    "agent_run_queue_wait_seconds",
+    "Agent运行在会话锁与全局并发限制上的排队耗时",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+AGENT_RUNS_REJECTED = Counter(
+    "agent_runs_rejected_total",
+    "因排队已满或等待超时被拒绝的Agent运行数",
+    ["reason"],
+)
+AGENT_RUN_DURATION = Histogram(
+    "agent_run_duration_seconds",
+    "一轮对话的端到端耗时（含排队），outcome为 completed / deadline / max_steps / cancelled / error",
+    ["outcome"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600),
+)
+AGENT_BUDGET_EXHAUSTED = Counter(
+    "agent_budget_exhausted_total",
+    "因时间或步数预算耗尽而提前给出回答的运行数",
+    ["reason"],
+)
+AGENT_RUNS_CANCELLED = Counter(
+    "agent_runs_cancelled_total",
+    "因客户端断开被取消的Agent运行数",
+    ["endpoint"],
+)
@@ -0,0 +1,44 @@
+import time
+
+from starlette.routing import Match
+
+from monitoring.metrics import REQUEST_LATENCY
+
+
+class PrometheusMiddleware:
+    """记录每个路由的请求耗时
+
+    使用纯ASGI中间件而不是BaseHTTPMiddleware，流式响应的耗时会统计到最后一个数据块发送完成
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = self._route_template(scope)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(scope["method"], route, str(status["code"])).observe(time.perf_counter() - start)
+
+    @staticmethod
+    def _route_template(scope) -> str:
+        """使用路由模板而不是原始路径作为标签，避免thread_id等路径参数导致标签爆炸"""
+        app = scope.get("app")
+        for route in getattr(getattr(app, "router", None), "routes", []):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
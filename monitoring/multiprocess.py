@@ -0,0 +1,39 @@
+import os
+import shutil
+from typing import List
+
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+from prometheus_client.registry import Collector
+
+# 只反映当前worker状态的采集器（如连接池），多进程模式下随抓取一并输出
+LOCAL_COLLECTORS: List[Collector] = []
+
+
+def is_multiprocess() -> bool:
+    """是否以prometheus多进程模式运行"""
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def prepare_multiprocess_dir(path: str):
+    """清空并启用多进程指标目录，必须在worker进程启动前调用"""
+    path = os.path.abspath(path)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+
+
+def get_registry() -> CollectorRegistry:
+    """获取用于输出指标的registry，多进程模式下汇总所有worker写入的指标文件"""
+    if not is_multiprocess():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    for collector in LOCAL_COLLECTORS:
+        registry.register(collector)
+    return registry
+
+
+def mark_worker_dead():
+    """worker退出时清理其livesum类型的gauge"""
+    if is_multiprocess():
+        multiprocess.mark_process_dead(os.getpid())
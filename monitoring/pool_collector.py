@@ -0,0 +1,62 @@
+import os
+from typing import Optional
+
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import REGISTRY, Collector
+from psycopg_pool import AsyncConnectionPool
+
+from monitoring.multiprocess import LOCAL_COLLECTORS, is_multiprocess
+
+
+class ConnectionPoolCollector(Collector):
+    """在抓取时读取AsyncConnectionPool的统计信息，多进程模式下按worker区分"""
+
+    def __init__(self, pool: AsyncConnectionPool, worker: Optional[str] = None):
+        self.pool = pool
+        self.labels = ["worker"] if worker else []
+        self.label_values = [worker] if worker else []
+
+    def collect(self):
+        stats = self.pool.get_stats()
+        size = stats.get("pool_size", 0)
+        available = stats.get("pool_available", 0)
+
+        gauges = {
+            "db_pool_size": ("连接池当前连接数", size),
+            "db_pool_max": ("连接池最大连接数", stats.get("pool_max", 0)),
+            "db_pool_in_use": ("正在使用的连接数", size - available),
+            "db_pool_waiting": ("等待获取连接的请求数", stats.get("requests_waiting", 0)),
+        }
+        for name, (documentation, value) in gauges.items():
+            family = GaugeMetricFamily(name, documentation, labels=self.labels)
+            family.add_metric(self.label_values, value)
+            yield family
+
+        counters = {
+            "db_pool_requests": ("获取连接的请求总数", stats.get("requests_num", 0)),
+            "db_pool_requests_queued": ("需要排队的请求总数", stats.get("requests_queued", 0)),
+            "db_pool_wait_seconds": ("排队等待连接的累计耗时", stats.get("requests_wait_ms", 0) / 1000),
+            "db_pool_errors": ("获取连接失败的次数", stats.get("requests_errors", 0)),
+        }
+        for name, (documentation, value) in counters.items():
+            family = CounterMetricFamily(name, documentation, labels=self.labels)
+            family.add_metric(self.label_values, value)
+            yield family
+
+
+def register_pool_collector(pool: AsyncConnectionPool) -> ConnectionPoolCollector:
+    """注册连接池指标采集器"""
+    collector = ConnectionPoolCollector(pool, str(os.getpid()) if is_multiprocess() else None)
+    if is_multiprocess():
+        LOCAL_COLLECTORS.append(collector)
+    else:
+        REGISTRY.register(collector)
+    return collector
+
+
+def unregister_pool_collector(collector: ConnectionPoolCollector):
+    """注销连接池指标采集器"""
+    if collector in LOCAL_COLLECTORS:
+        LOCAL_COLLECTORS.remove(collector)
+    else:
+        REGISTRY.unregister(collector)
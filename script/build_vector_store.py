@@ -1,54 +1,395 @@
+import hashlib
+import json
 import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, List
 
 import chromadb
 from dotenv import load_dotenv
-from langchain_community.document_loaders import DirectoryLoader
+from langchain_community.document_loaders import UnstructuredFileLoader
 from langchain_community.embeddings import OllamaEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 load_dotenv()
 
+# 以脚本方式运行时，将项目根目录加入模块搜索路径，以复用服务端的Embedding缓存
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def create_vector_store():
-    # 加载文档、进行切分、创建向量嵌入，并将其持久化存储到 ChromaDB。
-    print("正在从 './knowledge_base' 文件夹加载文档...")
-
-    # 匹配.txt .pdf .docx .doc文件
-    loader = DirectoryLoader(
-        './knowledge_base/',
-        glob="**/*[.txt,.pdf,.docx,.doc]",
-        show_progress=True,
-        use_multithreading=True
-    )
-    documents = loader.load()
+from cache import CachedEmbeddings, bump_collection_version, create_cached_embeddings  # noqa: E402
 
-    # 如果没有载入任何文档，就提前结束
-    if not documents:
-        print("未找到任何文档，请检查 'knowledge_base' 文件夹。")
-        return
+KNOWLEDGE_BASE_DIR = './knowledge_base/'
+SUPPORTED_SUFFIXES = {".txt", ".pdf", ".docx", ".doc"}
+MANIFEST_PATH = os.getenv("INDEX_MANIFEST_PATH", "./.cache/index_manifest.json")
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# 清单格式版本：切块ID的生成方式变化时递增，旧清单失效并全量重建（为旧切块补齐start_index等元数据）
+MANIFEST_VERSION = 2
+
+# 流水线配置：解析进程数、Embedding并发数、批大小与阶段间队列长度
+PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", os.cpu_count() or 1))
+EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", 4))
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", 64))
+UPSERT_BATCH_SIZE = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", 256))
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 8))
+
+_STOP = object()
+
+
+class StageStats:
+    """流水线阶段统计"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, items: int, seconds: float):
+        with self._lock:
+            self.items += items
+            self.busy_seconds += seconds
+
+    def report(self, elapsed: float) -> str:
+        throughput = self.items / elapsed if elapsed else 0.0
+        return f"{self.name}: {self.items} 项, 累计耗时 {self.busy_seconds:.2f}s, 吞吐 {throughput:.1f} 项/s"
+
+
+class IndexManifest:
+    """索引清单：记录每个文件的内容哈希及其切块ID，用于增量重建索引"""
+
+    def __init__(self, path: str, collection_name: str):
+        self.path = path
+        self.collection_name = collection_name
+        self.files: Dict[str, Dict] = {}
+
+    def load(self) -> bool:
+        """加载清单，清单不存在、格式版本不一致或属于其他集合时返回False"""
+        if not os.path.exists(self.path):
+            return False
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        if data.get("version") != MANIFEST_VERSION or data.get("collection") != self.collection_name:
+            return False
+
+        self.files = data.get("files", {})
+        return True
+
+    def save(self):
+        """原子地写入清单"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": MANIFEST_VERSION, "collection": self.collection_name, "files": self.files},
+                f, ensure_ascii=False
+            )
+        os.replace(tmp_path, self.path)
 
-    print(f"已载入 {len(documents)} 份文档。正在将文档切分为小块...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+
+def discover_files(root: str) -> List[str]:
+    """查找知识库目录下支持的文件（.txt .pdf .docx .doc）"""
+    paths = []
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in SUPPORTED_SUFFIXES:
+                paths.append(os.path.relpath(os.path.join(directory, filename), root))
+    return sorted(paths)
+
+
+def file_fingerprint(root: str, rel_path: str, previous: Dict) -> Dict:
+    """计算文件指纹，大小与修改时间未变时复用上次的内容哈希"""
+    path = os.path.join(root, rel_path)
+    stat = os.stat(path)
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": previous["hash"]}
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": digest.hexdigest()}
+
+
+def chunk_ids(rel_path: str, texts: List[str], metadatas: List[Dict]) -> List[str]:
+    """生成确定性的切块ID：来源路径 + 切块内容 + 元数据的哈希（同文件内重复内容追加序号）
+
+    元数据包含start_index，内容不变但位置移动的切块会得到新ID并重新写入，避免Chroma中的位置信息过期
+    """
+    ids = []
+    seen: Dict[str, int] = {}
+    for text, metadata in zip(texts, metadatas):
+        key = json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256(f"{rel_path}\0{text}\0{key}".encode("utf-8")).hexdigest()
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        ids.append(digest if occurrence == 0 else f"{digest}-{occurrence}")
+    return ids
+
+
+def parse_file(root: str, rel_path: str) -> Dict[str, Any]:
+    """在子进程中解析并切分单个文件，只返回可序列化的纯数据"""
+    start = time.perf_counter()
+    documents = UnstructuredFileLoader(os.path.join(root, rel_path)).load()
+    parsed = time.perf_counter()
+
+    for document in documents:
+        document.metadata["source"] = rel_path
+    # 记录切块在原文中的起始位置，检索时据此合并重叠的相邻切块
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, add_start_index=True
+    )
     chunks = text_splitter.split_documents(documents)
+    texts = [chunk.page_content for chunk in chunks]
+    metadatas = [chunk.metadata for chunk in chunks]
+
+    return {
+        "rel_path": rel_path,
+        "ids": chunk_ids(rel_path, texts, metadatas),
+        "texts": texts,
+        "metadatas": metadatas,
+        "parse_seconds": parsed - start,
+        "split_seconds": time.perf_counter() - parsed,
+    }
+
+
+def delete_in_batches(collection, ids: List[str]):
+    """分批删除切块"""
+    for start in range(0, len(ids), UPSERT_BATCH_SIZE):
+        collection.delete(ids=ids[start:start + UPSERT_BATCH_SIZE])
+
+
+class IngestPipeline:
+    """流式入库流水线：文件发现 → 进程池解析 → 切分 → 批量并发Embedding → 批量写入
+
+    阶段之间使用有界队列，内存占用取决于并发数与队列长度，而不是知识库规模
+    """
 
-    print(f"已切分为 {len(chunks)} 个小块。正在创建并存储到 ChromaDB...")
-    embeddings = OllamaEmbeddings(
-        model=os.getenv("EMBEDDING_MODEL")
+    def __init__(self, collection, embeddings):
+        self.collection = collection
+        self.embeddings = embeddings
+        self.embed_queue: "queue.Queue" = queue.Queue(maxsize=QUEUE_SIZE)
+        self.upsert_queue: "queue.Queue" = queue.Queue(maxsize=QUEUE_SIZE)
+        self.failed = threading.Event()
+        self.errors: List[BaseException] = []
+
+        self.stats = {
+            "discover": StageStats("文件发现"),
+            "parse": StageStats("文档解析"),
+            "split": StageStats("文档切分"),
+            "embed": StageStats("向量嵌入"),
+            "upsert": StageStats("批量写入"),
+        }
+        self._buffer: Dict[str, List] = {"ids": [], "texts": [], "metadatas": []}
+
+    def run(self, paths: List[str], manifest: IndexManifest) -> Dict[str, Any]:
+        """执行流水线，返回新的清单条目与变更统计"""
+        embed_threads = [
+            threading.Thread(target=self._embed_worker, name=f"embed-{i}", daemon=True)
+            for i in range(EMBED_WORKERS)
+        ]
+        upsert_thread = threading.Thread(target=self._upsert_worker, name="upsert", daemon=True)
+        for thread in embed_threads + [upsert_thread]:
+            thread.start()
+
+        new_files: Dict[str, Dict] = {}
+        stale_ids: List[str] = []
+        result = {"changed_files": 0, "pending_chunks": 0}
+
+        try:
+            with ProcessPoolExecutor(max_workers=PARSE_WORKERS) as pool:
+                in_flight = deque()
+                fingerprints: Dict[str, Dict] = {}
+
+                for rel_path in paths:
+                    if self.failed.is_set():
+                        break
+
+                    start = time.perf_counter()
+                    previous = manifest.files.get(rel_path)
+                    fingerprint = file_fingerprint(KNOWLEDGE_BASE_DIR, rel_path, previous)
+                    self.stats["discover"].add(1, time.perf_counter() - start)
+
+                    if previous and previous["hash"] == fingerprint["hash"]:
+                        new_files[rel_path] = {**fingerprint, "chunk_ids": previous["chunk_ids"]}
+                        continue
+
+                    result["changed_files"] += 1
+                    fingerprints[rel_path] = fingerprint
+                    in_flight.append(pool.submit(parse_file, KNOWLEDGE_BASE_DIR, rel_path))
+
+                    # 限制同时在途的解析任务数量，解析结果消费不及时会反压文件发现
+                    if len(in_flight) >= PARSE_WORKERS * 2:
+                        in_flight = self._drain(in_flight, manifest, fingerprints, new_files, stale_ids, result)
+
+                while in_flight:
+                    in_flight = self._drain(in_flight, manifest, fingerprints, new_files, stale_ids, result)
+
+            self._flush_buffer()
+        finally:
+            for _ in embed_threads:
+                self.embed_queue.put(_STOP)
+            for thread in embed_threads:
+                thread.join()
+            self.upsert_queue.put(_STOP)
+            upsert_thread.join()
+
+        if self.errors:
+            raise self.errors[0]
+
+        # 已删除文件的切块
+        for rel_path, previous in manifest.files.items():
+            if rel_path not in new_files:
+                stale_ids.extend(previous["chunk_ids"])
+        if stale_ids:
+            delete_in_batches(self.collection, stale_ids)
+
+        result.update({"files": new_files, "stale_chunks": len(stale_ids)})
+        return result
+
+    def _drain(self, in_flight, manifest, fingerprints, new_files, stale_ids, result) -> deque:
+        """等待至少一个解析任务完成，并按完成顺序将新切块送入Embedding阶段"""
+        done, not_done = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            parsed = future.result()
+            rel_path = parsed["rel_path"]
+            self.stats["parse"].add(1, parsed["parse_seconds"])
+            self.stats["split"].add(len(parsed["ids"]), parsed["split_seconds"])
+
+            previous = manifest.files.get(rel_path)
+            old_ids = set(previous["chunk_ids"]) if previous else set()
+            stale_ids.extend(old_ids - set(parsed["ids"]))
+
+            for chunk_id, text, metadata in zip(parsed["ids"], parsed["texts"], parsed["metadatas"]):
+                if chunk_id not in old_ids:
+                    self._buffer["ids"].append(chunk_id)
+                    self._buffer["texts"].append(text)
+                    self._buffer["metadatas"].append(metadata)
+                    result["pending_chunks"] += 1
+                    if len(self._buffer["ids"]) >= EMBED_BATCH_SIZE:
+                        self._flush_buffer()
+
+            new_files[rel_path] = {**fingerprints.pop(rel_path), "chunk_ids": parsed["ids"]}
+        return deque(not_done)
+
+    def _flush_buffer(self):
+        """将缓冲的切块作为一批送入Embedding队列（队列满时阻塞，形成反压）"""
+        if self._buffer["ids"]:
+            self.embed_queue.put(self._buffer)
+            self._buffer = {"ids": [], "texts": [], "metadatas": []}
+
+    def _embed_worker(self):
+        """Embedding阶段：批量计算向量"""
+        while True:
+            batch = self.embed_queue.get()
+            if batch is _STOP:
+                return
+            if self.failed.is_set():
+                continue
+
+            try:
+                start = time.perf_counter()
+                batch["embeddings"] = self.embeddings.embed_documents(batch["texts"])
+                self.stats["embed"].add(len(batch["ids"]), time.perf_counter() - start)
+                self.upsert_queue.put(batch)
+            except Exception as e:
+                self.errors.append(e)
+                self.failed.set()
+
+    def _upsert_worker(self):
+        """写入阶段：合并批次后批量upsert到Chroma"""
+        pending: Dict[str, List] = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+
+        def flush():
+            if not pending["ids"] or self.failed.is_set():
+                return
+            start = time.perf_counter()
+            self.collection.upsert(**pending)
+            self.stats["upsert"].add(len(pending["ids"]), time.perf_counter() - start)
+            for values in pending.values():
+                values.clear()
+
+        while True:
+            batch = self.upsert_queue.get()
+            try:
+                if batch is _STOP:
+                    flush()
+                    return
+                if self.failed.is_set():
+                    continue
+
+                pending["ids"].extend(batch["ids"])
+                pending["documents"].extend(batch["texts"])
+                pending["metadatas"].extend(batch["metadatas"])
+                pending["embeddings"].extend(batch["embeddings"])
+                if len(pending["ids"]) >= UPSERT_BATCH_SIZE:
+                    flush()
+            except Exception as e:
+                self.errors.append(e)
+                self.failed.set()
+                if batch is _STOP:
+                    return
+
+
+def create_vector_store():
+    # 增量地加载文档、进行切分、创建向量嵌入，并将其持久化存储到 ChromaDB。
+    # 只有新增或内容变化的切块会被嵌入并写入，来源文件变化或删除后残留的切块会被清理。
+    collection_name = os.getenv("COLLECTION_NAME", "agent_knowledge_base")
+    embedding_model = os.getenv("EMBEDDING_MODEL")
+    embeddings = create_cached_embeddings(
+        OllamaEmbeddings(model=embedding_model),
+        embedding_model
     )
 
-    # 初始化chroma客户端
+    # 初始化chroma客户端，使用与langchain Chroma相同的集合，向量由流水线自行计算
     client = chromadb.HttpClient(host=os.getenv("CHROMA_HOST"), port=int(os.getenv("CHROMA_PORT")))
+    collection = client.get_or_create_collection(name=collection_name, embedding_function=None)
 
-    # 文档列表创建新的Chroma向量存储实例
-    _ = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        client=client,
-        collection_name=os.getenv("COLLECTION_NAME", "agent_knowledge_base")
-    )
+    manifest = IndexManifest(MANIFEST_PATH, collection_name)
+    if not manifest.load() or collection.count() == 0:
+        # 没有可用清单时，集合中可能残留旧版本脚本写入的切块（随机ID或缺少start_index），先清空后全量重建
+        existing_ids = collection.get(include=[])["ids"]
+        if existing_ids:
+            print(f"未找到有效的索引清单，正在清理集合中已有的 {len(existing_ids)} 个切块...")
+            delete_in_batches(collection, existing_ids)
+        manifest.files = {}
+
+    print(f"正在扫描 '{KNOWLEDGE_BASE_DIR}' 文件夹...")
+    paths = discover_files(KNOWLEDGE_BASE_DIR)
+    if not paths:
+        print("未找到任何文档，请检查 'knowledge_base' 文件夹。")
+
+    print(f"共 {len(paths)} 份文档，解析进程数 {PARSE_WORKERS}，Embedding并发数 {EMBED_WORKERS}。")
+    started = time.perf_counter()
+    pipeline = IngestPipeline(collection, embeddings)
+    result = pipeline.run(paths, manifest)
+    elapsed = time.perf_counter() - started
+
+    manifest.files = result["files"]
+    manifest.save()
+
+    print(f"其中 {result['changed_files']} 份新增或变化，"
+          f"写入 {result['pending_chunks']} 个切块，删除 {result['stale_chunks']} 个切块，耗时 {elapsed:.2f}s。")
+    for stage in pipeline.stats.values():
+        print(f"  {stage.report(elapsed)}")
+
+    if result["pending_chunks"] or result["stale_chunks"]:
+        # 更新集合版本号，使服务端的检索结果缓存失效
+        version = bump_collection_version(client, collection_name)
+        print(f"集合版本已更新为: {version}")
+        print("文件已成功更新并保存至ChromaDB!")
+    else:
+        print("知识库没有变化，无需更新。")
 
-    print("文件已成功创建并保存至ChromaDB!")
+    if isinstance(embeddings, CachedEmbeddings):
+        print(f"Embedding缓存统计: {embeddings.cache.stats()}")
+        embeddings.cache.close()
 
 
 if __name__ == "__main__":
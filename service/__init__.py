@@ -1,9 +1,45 @@
+import importlib
+from typing import TYPE_CHECKING
+
 __all__ = [
     "AgentService",
     "ChatService",
-    "VectorStoreService"
+    "CheckpointRetentionService",
+    "HealthService",
+    "VectorStoreService",
+    "shutdown_state"
 ]
 
-from .agent_service import AgentService
-from .chat_service import ChatService
-from .vector_store_service import VectorStoreService
+# 服务模块依赖langchain_community、chromadb、OpenAI客户端等重量级库，首次访问时才导入
+_MODULES = {
+    "AgentService": "agent_service",
+    "ChatService": "chat_service",
+    "CheckpointRetentionService": "retention_service",
+    "HealthService": "health_service",
+    "VectorStoreService": "vector_store_service",
+    "shutdown_state": "shutdown",
+}
+
+
+def __getattr__(name: str):
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def preload():
+    """导入全部服务模块，供启动阶段在线程中提前加载"""
+    for module in _MODULES.values():
+        importlib.import_module(f".{module}", __name__)
+
+
+if TYPE_CHECKING:
+    from .agent_service import AgentService
+    from .chat_service import ChatService
+    from .health_service import HealthService
+    from .retention_service import CheckpointRetentionService
+    from .shutdown import shutdown_state
+    from .vector_store_service import VectorStoreService
@@ -1,27 +1,42 @@
 import os
-from typing import List
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 from langchain_community.tools import DuckDuckGoSearchResults
+from langchain_core.caches import BaseCache
+from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_core.tools import BaseTool
 from langchain_openai import ChatOpenAI
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from langgraph.prebuilt import create_react_agent
 
+from cache import PostgresLLMCache, SQLiteLLMCache, ToolResultCache, cache_tool
 from config import settings
+from monitoring import MetricsCallbackHandler
+from service.context_manager import ContextAgentState, ConversationContextManager
+from service.mcp_service import McpSessionPool
 from service.vector_store_service import VectorStoreService
-from tools import KnowledgeBaseTool
+from tools import KnowledgeBaseTool, timeout_tool
+
+FINAL_ANSWER_PROMPT = "本轮处理已达到时间或步骤上限，不能再调用工具。请根据以上已获得的信息直接给出尽可能好的回答，并说明信息可能不完整。"
 
 
 class AgentService:
     """Agent服务类"""
 
-    def __init__(self, checkpointer: AsyncPostgresSaver, vector_store_service: VectorStoreService):
+    def __init__(self, checkpointer: BaseCheckpointSaver, vector_store_service: VectorStoreService):
         self.checkpointer = checkpointer
         self.vector_store_service = vector_store_service
         self.model = None
         self.tools = None
         self.agent_executor = None
+        self.knowledge_tool = None
+        self.mcp_pool = None
+        self.mcp_tools = None
+        self.tool_cache = None
+        self.prompt = None
+        self.context_manager = None
 
     async def initialize(self):
         """初始化Agent服务"""
@@ -30,6 +45,11 @@ class AgentService:
             model=settings.llm_model,
             base_url=settings.llm_base_url,
             api_key=settings.llm_api_key,
+            # 可选的响应缓存，键包含模型参数、工具定义与完整消息列表
+            cache=await self._create_llm_cache(),
+            # 流式输出时同样返回token用量
+            stream_usage=True,
+            timeout=settings.llm_timeout,
             # 启用LangSmith追踪的标签
             tags=["langchain-agent", "chat"]
         )
@@ -40,34 +60,80 @@ class AgentService:
         # 创建Agent
         self._create_agent()
 
+    async def _create_llm_cache(self) -> Optional[BaseCache]:
+        """按配置创建LLM响应缓存"""
+        if settings.llm_cache_backend == "postgres":
+            if not isinstance(self.checkpointer, AsyncPostgresSaver):
+                raise ValueError("postgres LLM缓存需要使用Postgres checkpointer")
+            llm_cache = PostgresLLMCache(
+                self.checkpointer.conn,
+                ttl=settings.llm_cache_ttl,
+                max_entries=settings.llm_cache_max_entries,
+                cache_tool_calls=settings.llm_cache_tool_calls
+            )
+            await llm_cache.setup()
+            return llm_cache
+        if settings.llm_cache_backend == "sqlite":
+            return SQLiteLLMCache(
+                settings.llm_cache_path,
+                ttl=settings.llm_cache_ttl,
+                max_entries=settings.llm_cache_max_entries,
+                cache_tool_calls=settings.llm_cache_tool_calls
+            )
+        return None
+
+    async def discover_mcp_tools(self) -> List[BaseTool]:
+        """启动MCP会话并获取工具，不依赖模型与向量存储，可在initialize之前与其他初始化步骤并行执行"""
+        if self.mcp_tools is not None:
+            return self.mcp_tools
+
+        # MCP工具：每个服务器保持一个长连接会话，并行启动
+        mcp_tools = []
+        if settings.mcp_enabled:
+            current_dir = os.getcwd()
+            self.mcp_pool = McpSessionPool({
+                "fetch": {
+                    "command": "uvx",
+                    "args": ["mcp-server-fetch"],
+                    "transport": "stdio"
+                },
+                "file_system": {
+                    "command": "npx",
+                    "args": ["-y", "@modelcontextprotocol/server-filesystem", current_dir],
+                    "transport": "stdio"
+                }
+            }, lazy_servers=settings.mcp_lazy_servers)
+            mcp_tools = await self.mcp_pool.get_tools()
+        self.mcp_tools = mcp_tools
+        return mcp_tools
+
     async def _initialize_tools(self):
         """初始化工具列表"""
-        # MCP客户端工具
-        current_dir = os.getcwd()
-        client = MultiServerMCPClient({
-            "fetch": {
-                "command": "uvx",
-                "args": ["mcp-server-fetch"],
-                "transport": "stdio"
-            },
-            "file_system": {
-                "command": "npx",
-                "args": ["-y", "@modelcontextprotocol/server-filesystem", current_dir],
-                "transport": "stdio"
-            }
-        })
-        mcp_tools = await client.get_tools()
+        mcp_tools = await self.discover_mcp_tools()
 
         # 知识库工具
-        knowledge_tool = KnowledgeBaseTool(
-            self.vector_store_service.get_vector_store()
-        )
+        self.knowledge_tool = KnowledgeBaseTool(self.vector_store_service)
 
         # 组合所有工具
+        tools = [
+                    DuckDuckGoSearchResults(),
+                    self.knowledge_tool.knowledge_base_retriever
+                ] + mcp_tools
+
+        # 网络搜索与网页抓取等外部调用结果缓存
+        if settings.tool_cache_enabled:
+            self.tool_cache = ToolResultCache(settings.tool_cache_size)
+            tools = [
+                cache_tool(tool, self.tool_cache, settings.tool_cache_ttls[tool.name])
+                if tool.name in settings.tool_cache_ttls else tool
+                for tool in tools
+            ]
+
+        # 工具超时，同时受本轮运行剩余时间限制
         self.tools = [
-                         DuckDuckGoSearchResults(),
-                         knowledge_tool.knowledge_base_retriever
-                     ] + mcp_tools
+            timeout_tool(tool, settings.tool_timeouts.get(tool.name, settings.tool_timeout))
+            for tool in tools
+        ]
 
     def _create_agent(self):
         """创建Agent执行器"""
@@ -83,17 +149,51 @@ class AgentService:
         - 网络搜索：可以搜索网络上的信息
         """
 
-        prompt = ChatPromptTemplate([
+        self.prompt = ChatPromptTemplate([
             ("system", system_prompt.strip()),
             ("placeholder", "{messages}")
         ])
 
+        # 按token预算管理上下文，超出部分滚动压缩为摘要
+        context_kwargs = {}
+        if settings.context_max_tokens:
+            self.context_manager = ConversationContextManager(
+                self.model, settings.context_max_tokens, settings.context_recent_tokens
+            )
+            context_kwargs = {
+                "state_schema": ContextAgentState,
+                "pre_model_hook": self.context_manager,
+            }
+
         self.agent_executor = create_react_agent(
             self.model,
             self.tools,
             checkpointer=self.checkpointer,
-            prompt=prompt
-        )
+            prompt=self.prompt,
+            **context_kwargs
+        ).with_config({"callbacks": [MetricsCallbackHandler()]})
+
+    @property
+    def recursion_limit(self) -> int:
+        """与最大步数对应的图执行步数上限：每步依次经过上下文管理、模型与工具节点"""
+        return settings.agent_max_steps * 3 + 2
+
+    async def astream_final_answer(self, state: Dict[str, Any]) -> AsyncIterator[str]:
+        """不再调用工具，根据会话中已获得的信息直接生成回答，返回文本增量，用于运行预算耗尽时"""
+        messages = self.context_manager.build_input(state) if self.context_manager else state.get("messages", [])
+        chain = self.prompt | self.model
+        async for chunk in chain.astream(
+                {"messages": list(messages) + [SystemMessage(content=FINAL_ANSWER_PROMPT)]},
+                config={"callbacks": [MetricsCallbackHandler()]}
+        ):
+            content = chunk.content
+            if isinstance(content, list):
+                content = "".join(
+                    part.get("text", "") if isinstance(part, dict) else str(part)
+                    for part in content
+                )
+            if content:
+                yield content
 
     def get_agent_executor(self):
         """获取Agent执行器"""
@@ -106,3 +206,22 @@ class AgentService:
         if not self.tools:
             raise RuntimeError("工具未初始化")
         return self.tools
+
+    def get_mcp_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取MCP服务器的启动与调用统计"""
+        return self.mcp_pool.get_stats() if self.mcp_pool else {}
+
+    async def close(self):
+        """关闭MCP会话"""
+        if self.mcp_pool:
+            await self.mcp_pool.close()
+
+    def get_tool_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各工具的缓存统计，按工具名索引"""
+        stats = {}
+        if self.knowledge_tool and self.knowledge_tool.get_cache_stats():
+            stats[self.knowledge_tool.knowledge_base_retriever.name] = self.knowledge_tool.get_cache_stats()
+        if self.tool_cache:
+            for name in settings.tool_cache_ttls:
+                stats[name] = self.tool_cache.stats(name)
+        return stats
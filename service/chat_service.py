@@ -1,99 +1,451 @@
-from typing import Any, AsyncGenerator, Dict, List
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.errors import GraphRecursionError
+from psycopg_pool import AsyncConnectionPool
+
+from config import settings
+from exception import AgentBusyException, ServiceDrainingException
+from models import BatchChatItem, ChatHistoryResponse, ChatRequest, ChatResponse, StreamEventType
+from monitoring import AGENT_BUDGET_EXHAUSTED, AGENT_RUN_DURATION
+from service.agent_service import AgentService
+from service.deadline import BudgetExhausted, Deadline, iterate_until
+from service.run_limiter import AgentRunLimiter, RunTicket
+from service.shutdown import shutdown_state
+from tools import RetrievalPrefetch
 
-from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+logger = logging.getLogger(__name__)
 
-from models import ChatHistoryResponse, ChatRequest, ChatResponse
-from service.agent_service import AgentService
+# 运行被取消时为未完成的工具调用补充的结果
+CANCELLED_TOOL_RESULT = "工具调用已取消：客户端已断开连接"
+# 运行预算耗尽时为未执行的工具调用补充的结果，以及最终回答生成失败时的回复
+BUDGET_TOOL_RESULT = "工具调用未执行：已达到本轮的时间或步骤上限"
+BUDGET_FALLBACK_ANSWER = "抱歉，本轮处理超出了时间或步骤上限，未能得到完整的回答，请稍后重试或缩小问题范围。"
 
 
 class ChatService:
     """聊天服务类"""
 
-    def __init__(self, agent_service: AgentService, checkpointer: AsyncPostgresSaver):
+    def __init__(
+            self,
+            agent_service: AgentService,
+            checkpointer: BaseCheckpointSaver,
+            pool: Optional[AsyncConnectionPool] = None
+    ):
         self.agent_service = agent_service
         self.checkpointer = checkpointer
+        self.pool = pool
+        self.run_limiter = AgentRunLimiter(
+            max_concurrent=settings.agent_max_concurrent_runs,
+            max_queued=settings.agent_max_queued_runs,
+            queue_timeout=settings.agent_queue_timeout,
+            retry_after=settings.agent_retry_after
+        )
+
+    def reserve_run(self, thread_id: str) -> RunTicket:
+        """申请Agent运行名额，排队已满时抛出AgentBusyException，停机排空中抛出ServiceDrainingException"""
+        if shutdown_state.draining:
+            raise ServiceDrainingException(settings.agent_retry_after)
+        return self.run_limiter.reserve(thread_id)
 
     async def chat(self, request: ChatRequest) -> ChatResponse:
-        """处理聊天请求"""
-        agent_executor = self.agent_service.get_agent_executor()
+        """处理聊天请求，时间或步数预算耗尽时根据已有信息给出回答"""
         thread_id = request.thread_id or "default"
-
-        config = {"configurable": {"thread_id": thread_id}}
+        deadline = self._create_deadline(request.deadline)
+        config = self._run_config(thread_id, deadline)
         input_message = {
             "role": "user",
             "content": request.message
         }
 
-        response_messages = []
-        async for step in agent_executor.astream(
-                {"messages": [input_message]}, config, stream_mode="values"
-        ):
-            if step["messages"]:
-                response_messages.append(step["messages"][-1])
-
-        if response_messages:
-            last_message = response_messages[-1]
-            response_content = last_message.content if hasattr(last_message, 'content') else str(last_message)
-        else:
-            response_content = "抱歉，我没有得到有效的响应。"
+        started = time.perf_counter()
+        outcome: Optional[str] = "error"
+        last_message = None
+        response_content = None
+        try:
+            async with self.reserve_run(thread_id):
+                try:
+                    async with aclosing(self._astream_agent(
+                            {"messages": [input_message]}, config, deadline, ["updates"],
+                            prefetch_query=request.message
+                    )) as chunks:
+                        async for _, update in chunks:
+                            for node_update in update.values():
+                                if isinstance(node_update, dict) and node_update.get("messages"):
+                                    last_message = node_update["messages"][-1]
+                    outcome = "completed"
+                except BudgetExhausted as e:
+                    outcome = e.reason
+                    response_content = "".join([
+                        delta async for delta in self._astream_best_answer(config, deadline, e.reason)
+                    ])
+                except asyncio.CancelledError:
+                    outcome = "cancelled"
+                    await self._checkpoint_interrupted_run(config)
+                    raise
+        except (AgentBusyException, ServiceDrainingException):
+            # 排队已满、排队超时或停机排空时被拒绝的请求没有运行，不计入运行耗时
+            outcome = None
+            raise
+        finally:
+            if outcome is not None:
+                AGENT_RUN_DURATION.labels(outcome).observe(time.perf_counter() - started)
+
+        if response_content is None:
+            if last_message is not None:
+                response_content = last_message.content if hasattr(last_message, 'content') else str(last_message)
+            else:
+                response_content = "抱歉，我没有得到有效的响应。"
 
         return ChatResponse(
             response=response_content,
             thread_id=thread_id
         )
 
-    async def stream_chat(self, request: ChatRequest) -> AsyncGenerator[Dict[str, Any], None]:
-        """处理流式聊天请求"""
-        agent_executor = self.agent_service.get_agent_executor()
+    async def batch_chat(
+            self,
+            items: List[BatchChatItem],
+            concurrency: Optional[int] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """并发处理批量聊天请求，按完成顺序返回每个条目的结果与耗时
+
+        未指定thread_id的条目使用独立的新会话，避免所有条目在同一会话上串行执行
+        """
+        concurrency = min(concurrency or settings.batch_default_concurrency, settings.batch_max_concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+        batch_id = uuid.uuid4().hex[:12]
+        started = time.perf_counter()
+
+        async def run(index: int, item: BatchChatItem) -> Dict[str, Any]:
+            thread_id = item.thread_id or f"batch-{batch_id}-{index}"
+            async with semaphore:
+                item_started = time.perf_counter()
+                result = {
+                    "index": index,
+                    "id": item.id,
+                    "thread_id": thread_id,
+                    "queued_ms": round((item_started - started) * 1000, 2),
+                }
+                try:
+                    response = await self.chat(
+                        ChatRequest(message=item.message, thread_id=thread_id, deadline=item.deadline)
+                    )
+                    result.update({"status": "success", "response": response.response})
+                except Exception as e:
+                    result.update({"status": "error", "error": str(e) or type(e).__name__})
+                result["elapsed_ms"] = round((time.perf_counter() - item_started) * 1000, 2)
+                return result
+
+        tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # 客户端断开时取消尚未完成的条目
+            for task in tasks:
+                task.cancel()
+
+    async def stream_chat(
+            self,
+            request: ChatRequest,
+            ticket: Optional[RunTicket] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """处理流式聊天请求，按token增量推送事件
+
+        ticket为调用方预先申请的运行名额，便于在开始推送前快速失败；
+        预算耗尽时先推送budget_exhausted事件，再推送根据已有信息生成的回答
+        """
         thread_id = request.thread_id or "default"
-
-        config = {"configurable": {"thread_id": thread_id}}
+        deadline = self._create_deadline(request.deadline)
+        config = self._run_config(thread_id, deadline)
         input_message = {
             "role": "user",
             "content": request.message
         }
 
+        started = time.perf_counter()
+        outcome: Optional[str] = "error"
+        # 当前模型调用已生成但尚未写入checkpoint的文本
+        partial: List[str] = []
+        # 已推送开始事件、尚未推送结束事件的工具调用
+        open_tool_calls: Dict[str, Optional[str]] = {}
+        try:
+            if ticket is None:
+                ticket = self.reserve_run(thread_id)
+
+            async with ticket:
+                try:
+                    try:
+                        async with aclosing(self._astream_agent(
+                                {"messages": [input_message]}, config, deadline, ["messages", "updates"],
+                                prefetch_query=request.message
+                        )) as chunks:
+                            async for mode, chunk in chunks:
+                                if mode == "messages":
+                                    event = self._parse_token_chunk(chunk)
+                                    if event:
+                                        partial.append(event['delta'])
+                                        yield event
+                                else:
+                                    if "agent" in chunk:
+                                        partial.clear()
+                                    for event in self._parse_update(chunk):
+                                        if event['type'] == StreamEventType.TOOL_CALL_START:
+                                            open_tool_calls[event['tool_call_id']] = event['name']
+                                        elif event['type'] == StreamEventType.TOOL_CALL_END:
+                                            open_tool_calls.pop(event['tool_call_id'], None)
+                                        yield event
+                        outcome = "completed"
+                    except BudgetExhausted as e:
+                        outcome = e.reason
+                        partial.clear()
+                        # 运行中断时仍在执行的工具调用会以失败结果补全
+                        for tool_call_id, name in open_tool_calls.items():
+                            yield {
+                                'type': StreamEventType.TOOL_CALL_END,
+                                'tool_call_id': tool_call_id,
+                                'name': name,
+                                'status': 'error',
+                            }
+                        open_tool_calls.clear()
+                        yield {'type': StreamEventType.BUDGET_EXHAUSTED, 'reason': e.reason, 'thread_id': thread_id}
+                        async for delta in self._astream_best_answer(config, deadline, e.reason):
+                            partial.append(delta)
+                            yield {'type': StreamEventType.TOKEN, 'delta': delta}
+                except asyncio.CancelledError:
+                    outcome = "cancelled"
+                    await self._checkpoint_interrupted_run(config, "".join(partial))
+                    raise
+
+            yield {'type': StreamEventType.FINAL, 'thread_id': thread_id}
+
+        except Exception as e:
+            if isinstance(e, (AgentBusyException, ServiceDrainingException)):
+                outcome = None
+            yield {'type': StreamEventType.ERROR, 'error': str(e), 'thread_id': thread_id}
+        finally:
+            if outcome is not None:
+                AGENT_RUN_DURATION.labels(outcome).observe(time.perf_counter() - started)
+            if ticket is not None:
+                ticket.discard()
+
+    @staticmethod
+    def _create_deadline(seconds: Optional[float]) -> Deadline:
+        """请求未指定时间预算时使用服务端默认值，并限制在上限以内"""
+        seconds = min(seconds or settings.agent_deadline, settings.agent_max_deadline)
+        return Deadline(seconds, reserve=settings.agent_answer_reserve)
+
+    def _run_config(self, thread_id: str, deadline: Deadline) -> Dict[str, Any]:
+        """运行配置，deadline随configurable传递给工具"""
+        return {
+            "configurable": {"thread_id": thread_id, "deadline": deadline},
+            "recursion_limit": self.agent_service.recursion_limit,
+        }
+
+    async def _astream_agent(
+            self,
+            agent_input: Dict[str, Any],
+            config: Dict[str, Any],
+            deadline: Deadline,
+            stream_mode: List[str],
+            prefetch_query: Optional[str] = None
+    ) -> AsyncGenerator[Tuple[str, Any], None]:
+        """执行Agent运行并返回(mode, chunk)，超出时间预算或最大步数时取消运行并抛出BudgetExhausted
+
+        启用预取时，按prefetch_query发起的知识库检索与首次模型调用并行执行
+        """
+        agent_executor = self.agent_service.get_agent_executor()
+        prefetch = self._start_prefetch(prefetch_query)
+        if prefetch:
+            config = {**config, "configurable": {**config["configurable"], "retrieval_prefetch": prefetch}}
+
+        steps = 0
+        try:
+            async with aclosing(iterate_until(
+                    agent_executor.astream(agent_input, config, stream_mode=stream_mode),
+                    deadline.run_expires_at
+            )) as chunks:
+                async for mode, chunk in chunks:
+                    if mode == "updates" and isinstance(chunk.get("agent"), dict):
+                        steps += 1
+                        messages = chunk["agent"].get("messages", [])
+                        # 达到最大步数后模型仍要求调用工具时停止运行，不再向调用方返回这些不会执行的工具调用
+                        if steps >= settings.agent_max_steps and messages and getattr(messages[-1], "tool_calls", None):
+                            raise BudgetExhausted("max_steps")
+                    yield mode, chunk
+        except GraphRecursionError:
+            raise BudgetExhausted("max_steps")
+        finally:
+            if prefetch:
+                prefetch.close()
+
+    def _start_prefetch(self, query: Optional[str]) -> Optional[RetrievalPrefetch]:
+        """按配置为用户消息发起推测式知识库检索"""
+        knowledge_tool = self.agent_service.knowledge_tool
+        if not settings.retrieval_prefetch_enabled or knowledge_tool is None or not query:
+            return None
+        return knowledge_tool.prefetch(query)
+
+    async def _astream_best_answer(
+            self,
+            config: Dict[str, Any],
+            deadline: Deadline,
+            reason: str
+    ) -> AsyncGenerator[str, None]:
+        """预算耗尽后不再调用工具，根据已获得的信息生成回答并写入会话，使用为回答预留的时间"""
+        AGENT_BUDGET_EXHAUSTED.labels(reason).inc()
+        values, _ = await self._close_tool_calls(config, BUDGET_TOOL_RESULT)
+
+        deltas = []
         try:
-            async for step in agent_executor.astream(
-                    {"messages": [input_message]}, config, stream_mode="values"
-            ):
-                if step["messages"]:
-                    message = step["messages"][-1]
-                    content = message.content if hasattr(message, 'content') else str(message)
-                    yield {'content': content, 'thread_id': thread_id}
+            async with aclosing(iterate_until(
+                    self.agent_service.astream_final_answer(values), deadline.expires_at
+            )) as chunks:
+                async for delta in chunks:
+                    deltas.append(delta)
+                    yield delta
+        except Exception as e:
+            logger.warning("预算耗尽后生成回答失败 %s: %s", config["configurable"]["thread_id"], e)
+
+        answer = "".join(deltas)
+        if not answer:
+            answer = BUDGET_FALLBACK_ANSWER
+            yield answer
+        await self._save_answer(config, answer, budget_exhausted=reason)
+
+    async def _close_tool_calls(self, config: Dict[str, Any], tool_result: str) -> Tuple[Dict[str, Any], bool]:
+        """为最后一条消息中未完成的工具调用补充结果，返回补全后的状态以及是否做了补全
+
+        LangGraph只保存已完成的步骤，运行被中断时最后一条消息可能带有尚未执行的工具调用
+        """
+        agent_executor = self.agent_service.get_agent_executor()
+        state = await agent_executor.aget_state(config)
+        values = dict(state.values) if state else {}
+        messages = values.get("messages", [])
+        last_message = messages[-1] if messages else None
+        if not (isinstance(last_message, AIMessage) and last_message.tool_calls):
+            return values, False
+
+        tool_messages = [
+            ToolMessage(content=tool_result, tool_call_id=tool_call["id"], name=tool_call["name"], status="error")
+            for tool_call in last_message.tool_calls
+        ]
+        await agent_executor.aupdate_state(config, {"messages": tool_messages}, as_node="tools")
+        values["messages"] = list(messages) + tool_messages
+        return values, True
+
+    async def _save_answer(self, config: Dict[str, Any], content: str, **metadata):
+        """以模型节点的身份写入回答，下一轮对话从该回答之后继续"""
+        agent_executor = self.agent_service.get_agent_executor()
+        await agent_executor.aupdate_state(config, {"messages": [
+            AIMessage(content=content, response_metadata=metadata)
+        ]}, as_node="agent")
+
+    async def _checkpoint_interrupted_run(self, config: Dict[str, Any], partial_text: str = ""):
+        """运行被取消后补全会话状态，保证下一轮对话可以继续
 
-            yield {'done': True, 'thread_id': thread_id}
+        为未完成的工具调用补充取消结果，没有未完成的工具调用时保存已生成的部分回答。
+        在调用方持有会话锁期间执行，且不受再次取消影响
+        """
+        async def repair():
+            _, closed = await self._close_tool_calls(config, CANCELLED_TOOL_RESULT)
+            if not closed and partial_text:
+                await self._save_answer(config, partial_text, interrupted=True)
 
+        try:
+            await asyncio.shield(repair())
         except Exception as e:
-            yield {'error': str(e)}
+            logger.warning("保存被取消的运行状态失败 %s: %s", config["configurable"]["thread_id"], e)
+
+    @staticmethod
+    def _parse_token_chunk(chunk) -> Optional[Dict[str, Any]]:
+        """解析messages模式下的消息块，只返回模型新生成的文本增量
+
+        命中LLM缓存时模型不产生流式分块，整条AIMessage会作为一个增量推送
+        """
+        message, metadata = chunk
+        if not isinstance(message, AIMessage):
+            return None
+        if metadata.get("langgraph_node") != "agent":
+            return None
+
+        content = message.content
+        if isinstance(content, list):
+            content = "".join(
+                part.get("text", "") if isinstance(part, dict) else str(part)
+                for part in content
+            )
+        if not content:
+            return None
+
+        return {'type': StreamEventType.TOKEN, 'delta': content}
+
+    @staticmethod
+    def _parse_update(update: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """解析updates模式下的节点输出，生成工具调用开始/结束事件"""
+        events = []
+
+        for node, node_update in update.items():
+            if not isinstance(node_update, dict):
+                continue
+
+            for message in node_update.get("messages", []):
+                if node == "agent" and getattr(message, 'tool_calls', None):
+                    for tool_call in message.tool_calls:
+                        events.append({
+                            'type': StreamEventType.TOOL_CALL_START,
+                            'tool_call_id': tool_call.get('id'),
+                            'name': tool_call.get('name'),
+                            'args': tool_call.get('args'),
+                        })
+                elif node == "tools" and isinstance(message, ToolMessage):
+                    events.append({
+                        'type': StreamEventType.TOOL_CALL_END,
+                        'tool_call_id': message.tool_call_id,
+                        'name': message.name,
+                        'status': getattr(message, 'status', 'success'),
+                    })
 
-    async def get_chat_history(self, thread_id: str = "default") -> ChatHistoryResponse:
-        """获取聊天历史"""
+        return events
+
+    async def get_chat_history(
+            self,
+            thread_id: str = "default",
+            limit: Optional[int] = None,
+            before: Optional[str] = None
+    ) -> ChatHistoryResponse:
+        """获取聊天历史，只读取最新的checkpoint，支持按消息ID游标分页"""
         config = {"configurable": {"thread_id": thread_id}}
         history = []
 
         try:
-            checkpoints = []
-            async for checkpoint_tuple in self.checkpointer.alist(config):
-                checkpoints.append(checkpoint_tuple)
+            latest_checkpoint = await self.checkpointer.aget_tuple(config)
 
-            if checkpoints:
-                latest_checkpoint = checkpoints[0]
+            if (latest_checkpoint and latest_checkpoint.checkpoint and
+                    'channel_values' in latest_checkpoint.checkpoint and
+                    'messages' in latest_checkpoint.checkpoint['channel_values']):
+                messages = latest_checkpoint.checkpoint['channel_values']['messages']
+                history = self._parse_messages(messages)
 
-                if (latest_checkpoint.checkpoint and
-                        'channel_values' in latest_checkpoint.checkpoint and
-                        'messages' in latest_checkpoint.checkpoint['channel_values']):
-                    messages = latest_checkpoint.checkpoint['channel_values']['messages']
-                    history = self._parse_messages(messages)
+            total_checkpoints = await self._count_checkpoints(thread_id) if latest_checkpoint else 0
+            page, next_cursor = self._paginate(history, limit, before)
 
             return ChatHistoryResponse(
                 thread_id=thread_id,
-                history=history,
+                history=page,
                 total_messages=len(history),
-                total_checkpoints=len(checkpoints),
+                total_checkpoints=total_checkpoints,
                 status="success" if history else "no_history",
-                latest_checkpoint_id=checkpoints[0].checkpoint['id'] if checkpoints else None,
-                latest_timestamp=checkpoints[0].checkpoint['ts'] if checkpoints else None
+                latest_checkpoint_id=latest_checkpoint.checkpoint['id'] if latest_checkpoint else None,
+                latest_timestamp=latest_checkpoint.checkpoint['ts'] if latest_checkpoint else None,
+                next_cursor=next_cursor,
+                has_more=next_cursor is not None
             )
 
         except Exception as e:
@@ -106,6 +458,40 @@ class ChatService:
                 message=f"该会话暂无历史记录: {str(e)}"
             )
 
+    async def _count_checkpoints(self, thread_id: str) -> int:
+        """通过主键索引统计会话的checkpoint数量，无需反序列化checkpoint内容；没有连接池时逐个遍历"""
+        if self.pool is None:
+            config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+            return len([item async for item in self.checkpointer.alist(config)])
+
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT count(*) FROM checkpoints WHERE thread_id = %s AND checkpoint_ns = ''",
+                (thread_id,)
+            )
+            row = await cur.fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _paginate(
+            history: List[Dict[str, Any]],
+            limit: Optional[int],
+            before: Optional[str]
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """返回游标之前最近的limit条消息，以及下一页的游标；游标不存在时返回空页"""
+        end = len(history)
+        if before:
+            for index, item in enumerate(history):
+                if item["message_id"] == before:
+                    end = index
+                    break
+            else:
+                return [], None
+
+        start = max(0, end - limit) if limit else 0
+        next_cursor = history[start]["message_id"] if start > 0 else None
+        return history[start:end], next_cursor
+
     def _parse_messages(self, messages) -> List[Dict[str, Any]]:
         """解析消息历史"""
         history = []
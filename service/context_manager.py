@@ -0,0 +1,109 @@
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AnyMessage, HumanMessage, SystemMessage
+from langchain_core.messages.utils import get_buffer_string
+from langgraph.prebuilt.chat_agent_executor import AgentState
+from typing_extensions import NotRequired
+
+from tools.tokens import estimate_message_tokens, estimate_tokens
+
+SUMMARY_PROMPT = """
+请将以下对话内容压缩为一段简洁的中文摘要，保留用户的目标、关键事实、已得出的结论以及工具调用的重要结果。
+如果已有摘要，请在其基础上合并新的对话内容，输出完整的新摘要。
+
+# 已有摘要
+{summary}
+
+# 新的对话内容
+{conversation}
+"""
+
+
+class ContextAgentState(AgentState):
+    """带上下文摘要的Agent状态，摘要随checkpoint持久化，避免每轮重复计算"""
+    context_summary: NotRequired[str]
+    summarized_until: NotRequired[Optional[str]]
+
+
+class ConversationContextManager:
+    """对话上下文管理：按token预算保留最近的对话，将更早的对话滚动合并为摘要
+
+    作为ReAct Agent的pre_model_hook使用，只改变发送给模型的消息，不修改消息历史
+    """
+
+    def __init__(self, model: BaseChatModel, max_tokens: int, recent_tokens: int):
+        # 摘要调用不向客户端推送token
+        self.model = model.with_config(tags=["nostream"])
+        self.max_tokens = max_tokens
+        self.recent_tokens = min(recent_tokens, max_tokens)
+
+    async def __call__(self, state: ContextAgentState) -> Dict[str, Any]:
+        messages = state["messages"]
+        summary = state.get("context_summary", "")
+        unsummarized = messages[self._summarized_index(messages, state.get("summarized_until")):]
+
+        if estimate_message_tokens(unsummarized) + estimate_tokens(summary) <= self.max_tokens:
+            return {"llm_input_messages": self._build_input(summary, unsummarized)}
+
+        split = self._find_split(unsummarized)
+        if split == 0:
+            return {"llm_input_messages": self._build_input(summary, unsummarized)}
+
+        to_summarize, recent = unsummarized[:split], unsummarized[split:]
+        summary = await self._summarize(summary, to_summarize)
+
+        return {
+            "llm_input_messages": self._build_input(summary, recent),
+            "context_summary": summary,
+            "summarized_until": to_summarize[-1].id,
+        }
+
+    def build_input(self, state: ContextAgentState) -> List[AnyMessage]:
+        """不生成新摘要，直接用已有摘要与未摘要的消息构造模型输入，超出预算时只保留最近的对话"""
+        messages = state["messages"]
+        summary = state.get("context_summary", "")
+        unsummarized = messages[self._summarized_index(messages, state.get("summarized_until")):]
+        if estimate_message_tokens(unsummarized) + estimate_tokens(summary) > self.max_tokens:
+            unsummarized = unsummarized[self._find_split(unsummarized):]
+        return self._build_input(summary, unsummarized)
+
+    @staticmethod
+    def _summarized_index(messages: List[AnyMessage], summarized_until: Optional[str]) -> int:
+        """定位第一条未被摘要的消息"""
+        if summarized_until:
+            for index, message in enumerate(messages):
+                if message.id == summarized_until:
+                    return index + 1
+        return 0
+
+    def _find_split(self, messages: List[AnyMessage]) -> int:
+        """从后往前寻找在最近对话预算内、以用户消息开头的切分点，保证工具调用与结果不被拆开
+
+        最后一条用户消息之后的内容始终保留，即使超出预算
+        """
+        split = 0
+        tokens = 0
+        for index in range(len(messages) - 1, -1, -1):
+            tokens += estimate_message_tokens([messages[index]])
+            if isinstance(messages[index], HumanMessage):
+                if tokens > self.recent_tokens and split:
+                    break
+                split = index
+        return split
+
+    async def _summarize(self, summary: str, messages: List[AnyMessage]) -> str:
+        """将已有摘要与新的对话内容合并为新摘要"""
+        prompt = SUMMARY_PROMPT.format(
+            summary=summary or "无",
+            conversation=get_buffer_string(messages)
+        )
+        response = await self.model.ainvoke([HumanMessage(content=prompt.strip())])
+        return response.content if isinstance(response.content, str) else str(response.content)
+
+    @staticmethod
+    def _build_input(summary: str, messages: List[AnyMessage]) -> List[AnyMessage]:
+        """构造发送给模型的消息列表，系统提示词由Agent的prompt负责添加"""
+        if not summary:
+            return list(messages)
+        return [SystemMessage(content=f"以下是之前对话的摘要：\n{summary}")] + list(messages)
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from contextlib import suppress
+from typing import AsyncIterator, TypeVar
+
+T = TypeVar("T")
+
+
+class BudgetExhausted(Exception):
+    """本轮对话的时间或步数预算耗尽，reason为 deadline 或 max_steps"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Deadline:
+    """一轮对话的截止时间
+
+    Agent运行与工具调用只能使用预留时间之前的部分，预留时间用于预算耗尽后生成最终回答
+    """
+
+    def __init__(self, seconds: float, reserve: float = 0.0):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.run_expires_at = self.expires_at - min(reserve, seconds / 2)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def run_remaining(self) -> float:
+        return max(0.0, self.run_expires_at - time.monotonic())
+
+
+async def iterate_until(stream: AsyncIterator[T], expires_at: float) -> AsyncIterator[T]:
+    """在独立任务中消费stream，到达截止时间时取消上游并抛出BudgetExhausted
+
+    上游在单个任务中执行，取消时其中正在进行的LLM与工具调用一并被取消
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    end = object()
+
+    async def pump():
+        try:
+            async for item in stream:
+                queue.put_nowait(item)
+        finally:
+            queue.put_nowait(end)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=max(0.0, expires_at - time.monotonic()))
+            except asyncio.TimeoutError:
+                raise BudgetExhausted("deadline")
+            if item is end:
+                break
+            yield item
+        # 传递上游的异常
+        await task
+    finally:
+        if not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
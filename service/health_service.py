@@ -0,0 +1,174 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+from psycopg_pool import AsyncConnectionPool
+
+from cache import CachedEmbeddings
+from config import settings
+from models import DependencyStatus, ReadinessResponse
+from service.agent_service import AgentService
+from service.chat_service import ChatService
+from service.shutdown import shutdown_state
+from service.vector_store_service import VectorStoreService
+
+
+class HealthService:
+    """就绪检查服务：并行检查各依赖，结果短时间缓存，频繁探测不会给依赖增加负载"""
+
+    def __init__(
+            self,
+            pool: Optional[AsyncConnectionPool],
+            vector_store_service: VectorStoreService,
+            agent_service: AgentService,
+            chat_service: ChatService
+    ):
+        self.pool = pool
+        self.vector_store_service = vector_store_service
+        self.agent_service = agent_service
+        self.chat_service = chat_service
+        self._cached: Optional[ReadinessResponse] = None
+        self._cached_at = float("-inf")
+        self._in_flight: Optional[asyncio.Task] = None
+
+    async def check_readiness(self) -> ReadinessResponse:
+        """获取就绪状态，缓存有效期内直接返回缓存结果，并发探测共享同一次检查"""
+        if shutdown_state.draining:
+            # 停机排空中，让负载均衡尽快摘除该实例
+            return ReadinessResponse(
+                status="draining",
+                checked_at=datetime.now(timezone.utc).isoformat(),
+                cached=False,
+                checks={}
+            )
+
+        if time.monotonic() - self._cached_at < settings.readiness_cache_ttl:
+            return self._cached.model_copy(update={"cached": True})
+
+        if self._in_flight is None:
+            self._in_flight = asyncio.create_task(self._run_checks())
+            self._in_flight.add_done_callback(lambda _: setattr(self, "_in_flight", None))
+        return await asyncio.shield(self._in_flight)
+
+    async def _run_checks(self) -> ReadinessResponse:
+        checks: Dict[str, tuple] = {
+            "postgres": (True, self._check_postgres),
+            "chroma": (True, self._check_chroma),
+            "llm": (True, self._check_llm),
+            "ollama": (True, self._check_ollama),
+            "mcp": (False, self._check_mcp),
+            "agent_runs": (False, self._check_agent_runs),
+        }
+        results = await asyncio.gather(*(
+            self._timed(critical, check) for critical, check in checks.values()
+        ))
+        statuses = dict(zip(checks, results))
+
+        if any(item.critical and item.status == "down" for item in statuses.values()):
+            status = "not_ready"
+        elif any(item.status == "saturated" for item in statuses.values()):
+            status = "saturated"
+        elif any(item.status != "up" for item in statuses.values()):
+            status = "degraded"
+        else:
+            status = "ready"
+
+        response = ReadinessResponse(
+            status=status,
+            checked_at=datetime.now(timezone.utc).isoformat(),
+            cached=False,
+            checks=statuses
+        )
+        self._cached = response
+        self._cached_at = time.monotonic()
+        return response
+
+    @staticmethod
+    async def _timed(critical: bool, check: Callable[[], Awaitable[Dict[str, Any]]]) -> DependencyStatus:
+        """带超时地执行单项检查并记录耗时"""
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(check(), timeout=settings.readiness_check_timeout)
+            status = result.pop("status", "up")
+            detail = result.pop("detail", None)
+            return DependencyStatus(
+                status=status,
+                critical=critical,
+                latency_ms=round((time.perf_counter() - start) * 1000, 2),
+                detail=detail,
+                saturation=result or None
+            )
+        except asyncio.TimeoutError:
+            detail = f"检查超时（{settings.readiness_check_timeout}s）"
+        except Exception as e:
+            detail = str(e) or type(e).__name__
+        return DependencyStatus(
+            status="down",
+            critical=critical,
+            latency_ms=round((time.perf_counter() - start) * 1000, 2),
+            detail=detail
+        )
+
+    async def _check_postgres(self) -> Dict[str, Any]:
+        if self.pool is None:
+            return {"detail": "使用内存checkpointer，未连接Postgres"}
+
+        stats = self.pool.get_stats()
+        pool_max = stats.get("pool_max", 0) or 1
+        in_use = stats.get("pool_size", 0) - stats.get("pool_available", 0)
+        waiting = stats.get("requests_waiting", 0)
+        result = {"in_use": in_use, "max": pool_max, "waiting": waiting}
+
+        # 连接池已饱和时不再额外申请连接做探测
+        if waiting or in_use / pool_max >= settings.readiness_pool_saturation:
+            return {"status": "saturated", **result}
+
+        async with self.pool.connection(timeout=settings.readiness_check_timeout) as conn:
+            await conn.execute("SELECT 1")
+        return result
+
+    async def _check_chroma(self) -> Dict[str, Any]:
+        await self.vector_store_service.async_chroma_client.heartbeat()
+        replica = self.vector_store_service.get_replica_stats()
+        if replica:
+            return {"replica_version": replica["version"], "replica_count": replica["count"]}
+        return {}
+
+    async def _check_llm(self) -> Dict[str, Any]:
+        async with httpx.AsyncClient(timeout=settings.readiness_check_timeout) as client:
+            response = await client.get(
+                f"{settings.llm_base_url.rstrip('/')}/models",
+                headers={"Authorization": f"Bearer {settings.llm_api_key}"}
+            )
+            response.raise_for_status()
+        return {}
+
+    async def _check_ollama(self) -> Dict[str, Any]:
+        embeddings = self.vector_store_service.embeddings
+        if isinstance(embeddings, CachedEmbeddings):
+            embeddings = embeddings.underlying
+        base_url = getattr(embeddings, "base_url", "http://localhost:11434")
+
+        async with httpx.AsyncClient(timeout=settings.readiness_check_timeout) as client:
+            response = await client.get(f"{base_url.rstrip('/')}/api/tags")
+            response.raise_for_status()
+        return {}
+
+    async def _check_mcp(self) -> Dict[str, Any]:
+        stats = self.agent_service.get_mcp_stats()
+        down = [
+            name for name, server in stats.items()
+            if server["started"] and not server["alive"]
+        ]
+        if down:
+            return {"status": "down", "detail": f"MCP服务器已断开: {', '.join(down)}"}
+        return {}
+
+    async def _check_agent_runs(self) -> Dict[str, Any]:
+        stats = self.chat_service.run_limiter.get_stats()
+        result = {"active": stats["active"], "max": stats["max_concurrent"], "waiting": stats["waiting"]}
+        if stats["waiting"] >= stats["max_queued"] * settings.readiness_pool_saturation:
+            return {"status": "saturated", **result}
+        return result
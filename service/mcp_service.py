@@ -0,0 +1,271 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+from langchain_mcp_adapters.client import MultiServerMCPClient
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _McpServer:
+    """单个MCP服务器的长连接会话
+
+    会话在独立的后台任务中打开和关闭（stdio客户端要求在同一个任务中进出上下文），
+    服务器进程崩溃后会在下一次调用时自动重启
+    """
+
+    def __init__(self, name: str, client: MultiServerMCPClient):
+        self.name = name
+        self.client = client
+        self.session = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._lock = asyncio.Lock()
+
+        self.stats = {
+            "started": False,
+            "starts": 0,
+            "restarts": 0,
+            "startup_seconds": None,
+            "calls": 0,
+            "errors": 0,
+            "call_seconds": 0.0,
+            "acquire_seconds": 0.0,
+        }
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def ensure_started(self):
+        """确保会话可用，未启动或已断开时（重新）启动"""
+        if self.alive:
+            return
+
+        async with self._lock:
+            if self.alive:
+                return
+            if self._task is not None:
+                await self._shutdown()
+            await self._start()
+
+    async def _start(self):
+        start = time.perf_counter()
+        ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        errors: List[BaseException] = []
+
+        async def run():
+            try:
+                async with self.client.session(self.name) as session:
+                    self.session = session
+                    ready.set()
+                    await self._stop.wait()
+            except Exception as e:
+                errors.append(e)
+                logger.warning("MCP服务器 %s 会话异常退出: %s", self.name, e)
+            finally:
+                self.session = None
+                ready.set()
+
+        self._task = asyncio.create_task(run(), name=f"mcp-{self.name}")
+        await ready.wait()
+        if errors or self.session is None:
+            raise RuntimeError(f"MCP服务器 {self.name} 启动失败: {errors[0] if errors else '未知错误'}")
+
+        self.stats["started"] = True
+        self.stats["starts"] += 1
+        self.stats["startup_seconds"] = round(time.perf_counter() - start, 3)
+
+    async def _shutdown(self):
+        if self._stop:
+            self._stop.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=5)
+            except (asyncio.TimeoutError, Exception):
+                self._task.cancel()
+        self._task = None
+        self.session = None
+
+    async def close(self):
+        async with self._lock:
+            await self._shutdown()
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any], retryable: bool = False):
+        """调用工具，服务器进程崩溃导致会话断开时重启会话
+
+        只有只读或幂等的工具才重试一次：断开前请求可能已被执行，重试非幂等工具（如写文件）会重复产生副作用
+        """
+        for attempt in range(2):
+            start = time.perf_counter()
+            await self.ensure_started()
+            acquired = time.perf_counter()
+            self.stats["acquire_seconds"] += acquired - start
+
+            try:
+                result = await self.session.call_tool(tool_name, arguments)
+                self.stats["calls"] += 1
+                self.stats["call_seconds"] += time.perf_counter() - acquired
+                return result
+            except Exception:
+                self.stats["errors"] += 1
+                if await self._healthy():
+                    raise
+                await self._mark_dead()
+                if attempt == 1 or not retryable:
+                    raise
+
+    async def _healthy(self) -> bool:
+        """通过ping判断会话是否仍然可用"""
+        if not self.alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=settings.mcp_ping_timeout)
+            return True
+        except Exception:
+            return False
+
+    async def _mark_dead(self):
+        """关闭已断开的会话，下一次调用时自动重启"""
+        async with self._lock:
+            if self._task is not None:
+                self.stats["restarts"] += 1
+                logger.warning("MCP服务器 %s 已断开，将在下次调用时重启", self.name)
+                await self._shutdown()
+
+    async def list_tools(self) -> List[Dict[str, Any]]:
+        await self.ensure_started()
+        result = await self.session.list_tools()
+        return [
+            {
+                "name": tool.name,
+                "description": tool.description or "",
+                "input_schema": tool.inputSchema,
+                "annotations": tool.annotations.model_dump(exclude_none=True) if tool.annotations else {},
+            }
+            for tool in result.tools
+        ]
+
+    async def ping(self):
+        """探活，失败时在下次调用前重启"""
+        if self.alive and not await self._healthy():
+            await self._mark_dead()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        calls = stats["calls"]
+        stats["alive"] = self.alive
+        stats["avg_call_ms"] = round(stats["call_seconds"] / calls * 1000, 2) if calls else None
+        stats["avg_acquire_ms"] = round(stats["acquire_seconds"] / calls * 1000, 3) if calls else None
+        stats["call_seconds"] = round(stats["call_seconds"], 3)
+        stats["acquire_seconds"] = round(stats["acquire_seconds"], 3)
+        return stats
+
+
+class McpSessionPool:
+    """MCP会话池：每个服务器一个长连接会话，并行启动，支持首次使用时延迟启动"""
+
+    def __init__(self, connections: Dict[str, Dict[str, Any]], lazy_servers: Optional[List[str]] = None):
+        self.client = MultiServerMCPClient(connections)
+        self.servers = {name: _McpServer(name, self.client) for name in connections}
+        self.lazy_servers = set(lazy_servers or [])
+        self._watchdog: Optional[asyncio.Task] = None
+
+    async def get_tools(self) -> List[BaseTool]:
+        """并行启动非延迟服务器并获取所有工具
+
+        延迟启动的服务器使用缓存的工具定义，没有缓存时仍会在启动阶段连接一次以获取定义
+        """
+        schema_cache = self._load_schema_cache()
+
+        async def discover(name: str) -> List[Dict[str, Any]]:
+            server = self.servers[name]
+            if name in self.lazy_servers and name in schema_cache:
+                return schema_cache[name]
+            return await server.list_tools()
+
+        names = list(self.servers)
+        results = await asyncio.gather(*(discover(name) for name in names), return_exceptions=True)
+
+        tools = []
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                logger.error("MCP服务器 %s 初始化失败: %s", name, result)
+                continue
+            schema_cache[name] = result
+            tools.extend(self._build_tool(name, definition) for definition in result)
+
+        self._save_schema_cache(schema_cache)
+        if settings.mcp_ping_interval and not self._watchdog:
+            self._watchdog = asyncio.create_task(self._watch())
+        return tools
+
+    def _build_tool(self, server_name: str, definition: Dict[str, Any]) -> BaseTool:
+        """基于工具定义创建通过会话池调用的LangChain工具"""
+        server = self.servers[server_name]
+        tool_name = definition["name"]
+        # 服务器声明为只读或幂等的工具在会话断开后可以安全重试，未声明（含旧的工具定义缓存）时不重试
+        annotations = definition.get("annotations") or {}
+        retryable = bool(annotations.get("readOnlyHint") or annotations.get("idempotentHint"))
+
+        async def call(**arguments) -> str:
+            result = await server.call_tool(tool_name, arguments, retryable)
+            text = "\n".join(
+                content.text if getattr(content, "type", None) == "text" else str(content)
+                for content in result.content
+            )
+            if result.isError:
+                raise ToolException(text)
+            return text
+
+        return StructuredTool(
+            name=tool_name,
+            description=definition["description"],
+            args_schema=definition["input_schema"],
+            coroutine=call,
+            metadata={"mcp_server": server_name},
+        )
+
+    async def _watch(self):
+        """定期探活已启动的服务器"""
+        while True:
+            await asyncio.sleep(settings.mcp_ping_interval)
+            await asyncio.gather(*(server.ping() for server in self.servers.values()))
+
+    @staticmethod
+    def _load_schema_cache() -> Dict[str, List[Dict[str, Any]]]:
+        path = settings.mcp_tool_schema_cache_path
+        if not path or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _save_schema_cache(schema_cache: Dict[str, List[Dict[str, Any]]]):
+        path = settings.mcp_tool_schema_cache_path
+        if not path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(schema_cache, f, ensure_ascii=False)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各服务器的启动与调用统计"""
+        return {name: server.get_stats() for name, server in self.servers.items()}
+
+    async def close(self):
+        """关闭所有会话及服务器进程"""
+        if self._watchdog:
+            self._watchdog.cancel()
+            self._watchdog = None
+        await asyncio.gather(*(server.close() for server in self.servers.values()), return_exceptions=True)
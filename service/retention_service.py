@@ -0,0 +1,310 @@
+import asyncio
+import fnmatch
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from psycopg_pool import AsyncConnectionPool
+
+from config import settings
+from core.checkpointer import referenced_blob_hashes
+
+logger = logging.getLogger(__name__)
+
+# 删除超出保留策略的历史checkpoint，每个命名空间始终保留最新的一个
+_DELETE_CHECKPOINTS_SQL = """
+WITH ranked AS (
+    SELECT checkpoint_ns, checkpoint_id,
+           row_number() OVER (PARTITION BY checkpoint_ns ORDER BY checkpoint_id DESC) AS rn,
+           (checkpoint->>'ts')::timestamptz AS ts
+    FROM checkpoints
+    WHERE thread_id = %(thread_id)s
+), deleted AS (
+    DELETE FROM checkpoints c
+    USING ranked r
+    WHERE c.thread_id = %(thread_id)s
+      AND c.checkpoint_ns = r.checkpoint_ns
+      AND c.checkpoint_id = r.checkpoint_id
+      AND r.rn > 1
+      AND ((%(keep_last)s::int IS NOT NULL AND r.rn > %(keep_last)s::int)
+           OR (%(cutoff)s::timestamptz IS NOT NULL AND r.ts < %(cutoff)s::timestamptz))
+    RETURNING pg_column_size(c.*) AS size
+)
+SELECT count(*) AS total_rows, COALESCE(sum(size), 0) AS total_bytes FROM deleted
+"""
+
+# 删除已不属于任何checkpoint的pending writes（只处理比最新checkpoint更早的记录，避免影响运行中的任务）
+_DELETE_WRITES_SQL = """
+WITH latest AS (
+    SELECT checkpoint_ns, max(checkpoint_id) AS checkpoint_id
+    FROM checkpoints WHERE thread_id = %(thread_id)s GROUP BY checkpoint_ns
+), deleted AS (
+    DELETE FROM checkpoint_writes w
+    USING latest l
+    WHERE w.thread_id = %(thread_id)s
+      AND w.checkpoint_ns = l.checkpoint_ns
+      AND w.checkpoint_id < l.checkpoint_id
+      AND NOT EXISTS (
+          SELECT 1 FROM checkpoints c
+          WHERE c.thread_id = w.thread_id AND c.checkpoint_ns = w.checkpoint_ns AND c.checkpoint_id = w.checkpoint_id
+      )
+    RETURNING pg_column_size(w.*) AS size
+)
+SELECT count(*) AS total_rows, COALESCE(sum(size), 0) AS total_bytes FROM deleted
+"""
+
+# 删除不再被任何checkpoint引用的通道数据，只处理比最新checkpoint引用版本更旧的版本，
+# 以免误删并发写入中、checkpoint尚未落库的新版本
+_DELETE_BLOBS_SQL = """
+WITH latest AS (
+    SELECT DISTINCT ON (checkpoint_ns) checkpoint_ns, checkpoint->'channel_versions' AS versions
+    FROM checkpoints WHERE thread_id = %(thread_id)s
+    ORDER BY checkpoint_ns, checkpoint_id DESC
+), deleted AS (
+    DELETE FROM checkpoint_blobs b
+    USING latest l
+    WHERE b.thread_id = %(thread_id)s
+      AND b.checkpoint_ns = l.checkpoint_ns
+      AND b.version < (l.versions->>b.channel)
+      AND NOT EXISTS (
+          SELECT 1 FROM checkpoints c
+          WHERE c.thread_id = b.thread_id AND c.checkpoint_ns = b.checkpoint_ns
+            AND c.checkpoint->'channel_versions'->>b.channel = b.version
+      )
+    RETURNING pg_column_size(b.*) AS size
+)
+SELECT count(*) AS total_rows, COALESCE(sum(size), 0) AS total_bytes FROM deleted
+"""
+
+_DELETE_THREAD_SQL = """
+WITH deleted AS (
+    DELETE FROM {table} t WHERE t.thread_id = %(thread_id)s RETURNING pg_column_size(t.*) AS size
+)
+SELECT count(*) AS total_rows, COALESCE(sum(size), 0) AS total_bytes FROM deleted
+"""
+
+# 外置存储的工具输出：只回收一段时间内未被写入刷新的内容，避免误删运行中、checkpoint尚未落库的引用
+_SIDE_BLOB_GRACE = timedelta(hours=1)
+_SIDE_BLOB_CANDIDATES_SQL = """
+SELECT hash FROM checkpoint_side_blobs WHERE thread_id = %(thread_id)s AND updated_at < %(side_cutoff)s
+"""
+_SIDE_BLOB_REFS_SQL = """
+SELECT type, blob FROM checkpoint_blobs WHERE thread_id = %(thread_id)s
+UNION ALL
+SELECT type, blob FROM checkpoint_writes WHERE thread_id = %(thread_id)s
+"""
+_DELETE_SIDE_BLOBS_SQL = """
+WITH deleted AS (
+    DELETE FROM checkpoint_side_blobs s
+    WHERE s.thread_id = %(thread_id)s AND s.hash = ANY(%(hashes)s)
+    RETURNING pg_column_size(s.*) AS size
+)
+SELECT count(*) AS total_rows, COALESCE(sum(size), 0) AS total_bytes FROM deleted
+"""
+
+# 多个worker各自运行清理任务，以事务级advisory lock保证同一时间只有一个worker执行清理
+_RETENTION_LOCK_KEY = 0x636B7074
+_TRY_LOCK_SQL = "SELECT pg_try_advisory_xact_lock(%s)"
+
+_THREAD_BATCH_SQL = """
+SELECT thread_id, max((checkpoint->>'ts')::timestamptz) AS last_active
+FROM checkpoints
+WHERE thread_id > %(after)s
+GROUP BY thread_id
+ORDER BY thread_id
+LIMIT %(limit)s
+"""
+
+
+@dataclass
+class RetentionPolicy:
+    """checkpoint保留策略"""
+    keep_last: Optional[int] = None
+    max_age: Optional[timedelta] = None
+    idle_ttl: Optional[timedelta] = None
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "RetentionPolicy":
+        """由配置字典创建策略，时间单位为天"""
+        max_age_days = config.get("max_age_days")
+        idle_days = config.get("idle_days")
+        return cls(
+            keep_last=config.get("keep_last"),
+            max_age=timedelta(days=max_age_days) if max_age_days is not None else None,
+            idle_ttl=timedelta(days=idle_days) if idle_days is not None else None,
+        )
+
+
+class CheckpointRetentionService:
+    """checkpoint保留与压缩服务：按会话策略清理历史checkpoint、孤立数据与闲置会话"""
+
+    def __init__(self, pool: AsyncConnectionPool):
+        self.pool = pool
+        self.default_policy = RetentionPolicy.from_config({
+            "keep_last": settings.checkpoint_retention_keep_last,
+            "max_age_days": settings.checkpoint_retention_max_age_days,
+            "idle_days": settings.checkpoint_retention_idle_days,
+        })
+        self.overrides = {
+            pattern: RetentionPolicy.from_config(config)
+            for pattern, config in settings.checkpoint_retention_overrides.items()
+        }
+        self.stats = {
+            "runs": 0,
+            "runs_skipped": 0,
+            "threads_scanned": 0,
+            "threads_deleted": 0,
+            "rows_reclaimed": 0,
+            "bytes_reclaimed": 0,
+            "last_run_at": None,
+            "last_run_seconds": None,
+        }
+        self._side_blobs: Optional[bool] = None
+
+    def get_policy(self, thread_id: str) -> RetentionPolicy:
+        """获取会话的保留策略，thread_id按通配符匹配覆盖配置"""
+        for pattern, policy in self.overrides.items():
+            if fnmatch.fnmatchcase(thread_id, pattern):
+                return policy
+        return self.default_policy
+
+    async def run_forever(self):
+        """后台循环执行清理"""
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("checkpoint清理失败")
+            await asyncio.sleep(settings.checkpoint_retention_interval)
+
+    async def run_once(self) -> Optional[Dict[str, int]]:
+        """执行一次清理，其他worker正在清理时跳过并返回None
+
+        锁在独立连接的事务中持有到清理结束，连接异常或任务取消时随事务回滚释放
+        """
+        async with self.pool.connection() as lock_conn:
+            async with lock_conn.transaction():
+                cur = await lock_conn.execute(_TRY_LOCK_SQL, (_RETENTION_LOCK_KEY,))
+                if not (await cur.fetchone())[0]:
+                    self.stats["runs_skipped"] += 1
+                    logger.debug("其他worker正在执行checkpoint清理，跳过本次清理")
+                    return None
+                return await self._sweep()
+
+    async def _sweep(self) -> Dict[str, int]:
+        """分批扫描所有会话并执行一次清理，返回本次回收的行数与字节数"""
+        started = datetime.now(timezone.utc)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = {"threads_scanned": 0, "threads_deleted": 0, "rows_reclaimed": 0, "bytes_reclaimed": 0}
+
+        after = ""
+        while True:
+            async with self.pool.connection() as conn:
+                cur = await conn.execute(
+                    _THREAD_BATCH_SQL, {"after": after, "limit": settings.checkpoint_retention_batch_size}
+                )
+                threads = await cur.fetchall()
+            if not threads:
+                break
+
+            for thread_id, last_active in threads:
+                rows, size, deleted = await self._compact_thread(thread_id, last_active, started)
+                result["threads_scanned"] += 1
+                result["threads_deleted"] += int(deleted)
+                result["rows_reclaimed"] += rows
+                result["bytes_reclaimed"] += size
+            after = threads[-1][0]
+
+            # 批次之间让出连接池与事件循环，避免影响聊天请求
+            await asyncio.sleep(settings.checkpoint_retention_batch_pause)
+
+        for key, value in result.items():
+            self.stats[key] += value
+        self.stats["runs"] += 1
+        self.stats["last_run_at"] = started.isoformat()
+        self.stats["last_run_seconds"] = round(loop.time() - start, 3)
+
+        logger.info(
+            "checkpoint清理完成: 扫描%d个会话, 删除%d个闲置会话, 回收%d行/%d字节",
+            result["threads_scanned"], result["threads_deleted"],
+            result["rows_reclaimed"], result["bytes_reclaimed"]
+        )
+        return result
+
+    async def _compact_thread(self, thread_id: str, last_active: datetime, now: datetime):
+        """按策略清理单个会话，返回(回收行数, 回收字节数, 是否删除了整个会话)"""
+        policy = self.get_policy(thread_id)
+        params = {"thread_id": thread_id}
+        rows = size = 0
+
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                if policy.idle_ttl is not None and last_active is not None and now - last_active > policy.idle_ttl:
+                    tables = ("checkpoint_writes", "checkpoint_blobs", "checkpoints")
+                    if await self._has_side_blobs(conn):
+                        tables = ("checkpoint_side_blobs",) + tables
+                    for table in tables:
+                        cur = await conn.execute(_DELETE_THREAD_SQL.format(table=table), params)
+                        deleted_rows, deleted_bytes = await cur.fetchone()
+                        rows += deleted_rows
+                        size += deleted_bytes
+                    return rows, size, True
+
+                if policy.keep_last is None and policy.max_age is None:
+                    return 0, 0, False
+
+                params.update({
+                    "keep_last": policy.keep_last,
+                    "cutoff": now - policy.max_age if policy.max_age is not None else None,
+                })
+                cur = await conn.execute(_DELETE_CHECKPOINTS_SQL, params)
+                deleted_rows, deleted_bytes = await cur.fetchone()
+                if not deleted_rows:
+                    return 0, 0, False
+                rows += deleted_rows
+                size += deleted_bytes
+
+                for sql in (_DELETE_WRITES_SQL, _DELETE_BLOBS_SQL):
+                    cur = await conn.execute(sql, params)
+                    deleted_rows, deleted_bytes = await cur.fetchone()
+                    rows += deleted_rows
+                    size += deleted_bytes
+
+                if await self._has_side_blobs(conn):
+                    deleted_rows, deleted_bytes = await self._delete_unreferenced_side_blobs(conn, thread_id, now)
+                    rows += deleted_rows
+                    size += deleted_bytes
+
+        return rows, size, False
+
+    async def _has_side_blobs(self, conn) -> bool:
+        """是否启用了工具输出外置存储（存在checkpoint_side_blobs表）"""
+        if self._side_blobs is None:
+            cur = await conn.execute("SELECT to_regclass('checkpoint_side_blobs') IS NOT NULL")
+            self._side_blobs = bool((await cur.fetchone())[0])
+        return self._side_blobs
+
+    async def _delete_unreferenced_side_blobs(self, conn, thread_id: str, now: datetime):
+        """删除会话中剩余checkpoint与pending writes均不再引用的外置内容，返回(回收行数, 回收字节数)"""
+        params = {"thread_id": thread_id, "side_cutoff": now - _SIDE_BLOB_GRACE}
+        cur = await conn.execute(_SIDE_BLOB_CANDIDATES_SQL, params)
+        candidates = {row[0] for row in await cur.fetchall()}
+        if not candidates:
+            return 0, 0
+
+        cur = await conn.execute(_SIDE_BLOB_REFS_SQL, params)
+        referenced = await asyncio.to_thread(referenced_blob_hashes, await cur.fetchall())
+        unreferenced = list(candidates - referenced)
+        if not unreferenced:
+            return 0, 0
+
+        cur = await conn.execute(_DELETE_SIDE_BLOBS_SQL, {**params, "hashes": unreferenced})
+        return await cur.fetchone()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取累计清理统计"""
+        return dict(self.stats)
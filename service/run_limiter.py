@@ -0,0 +1,130 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from exception import AgentBusyException
+from monitoring import AGENT_QUEUE_WAIT, AGENT_RUNS_ACTIVE, AGENT_RUNS_REJECTED, AGENT_RUNS_WAITING
+
+
+class _ThreadLock:
+    """会话锁及其引用计数，无人使用时从字典中移除"""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class RunTicket:
+    """一次Agent运行的准入凭证
+
+    reserve时同步完成快速失败检查并占用排队名额；进入上下文时依次获取会话锁与全局并发名额，
+    保证同一会话的多轮对话按顺序执行
+    """
+
+    def __init__(self, limiter: "AgentRunLimiter", thread_id: str):
+        self.limiter = limiter
+        self.thread_id = thread_id
+        self.created_at = time.monotonic()
+        self._waiting = True
+        self._thread_lock: Optional[_ThreadLock] = None
+        self._locked = False
+        self._admitted = False
+
+    async def __aenter__(self) -> "RunTicket":
+        limiter = self.limiter
+        deadline = self.created_at + limiter.queue_timeout
+        self._thread_lock = limiter._acquire_thread_lock(self.thread_id)
+
+        try:
+            await asyncio.wait_for(self._thread_lock.lock.acquire(), timeout=max(0.0, deadline - time.monotonic()))
+            self._locked = True
+            await asyncio.wait_for(limiter._semaphore.acquire(), timeout=max(0.0, deadline - time.monotonic()))
+            self._admitted = True
+        except asyncio.TimeoutError:
+            AGENT_RUNS_REJECTED.labels("timeout").inc()
+            self._release()
+            raise AgentBusyException(limiter.retry_after)
+        except BaseException:
+            self._release()
+            raise
+
+        self._stop_waiting()
+        limiter.active += 1
+        AGENT_RUNS_ACTIVE.inc()
+        AGENT_QUEUE_WAIT.observe(time.monotonic() - self.created_at)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._admitted:
+            self.limiter.active -= 1
+            AGENT_RUNS_ACTIVE.dec()
+        self._release()
+
+    def discard(self):
+        """放弃未使用的凭证（例如客户端在开始执行前断开）"""
+        if not self._admitted:
+            self._release()
+
+    def _stop_waiting(self):
+        if self._waiting:
+            self._waiting = False
+            self.limiter.waiting -= 1
+            AGENT_RUNS_WAITING.dec()
+
+    def _release(self):
+        self._stop_waiting()
+        if self._admitted:
+            self._admitted = False
+            self.limiter._semaphore.release()
+        if self._locked:
+            self._locked = False
+            self._thread_lock.lock.release()
+        if self._thread_lock is not None:
+            self.limiter._release_thread_lock(self.thread_id, self._thread_lock)
+            self._thread_lock = None
+
+
+class AgentRunLimiter:
+    """Agent运行准入控制：同一会话串行执行，全局并发数受限，排队已满时快速失败"""
+
+    def __init__(self, max_concurrent: int, max_queued: int, queue_timeout: float, retry_after: int):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._thread_locks: Dict[str, _ThreadLock] = {}
+
+    def reserve(self, thread_id: str) -> RunTicket:
+        """申请运行名额，排队已满时立即抛出AgentBusyException"""
+        if self.waiting >= self.max_queued:
+            AGENT_RUNS_REJECTED.labels("queue_full").inc()
+            raise AgentBusyException(self.retry_after)
+
+        self.waiting += 1
+        AGENT_RUNS_WAITING.inc()
+        return RunTicket(self, thread_id)
+
+    def _acquire_thread_lock(self, thread_id: str) -> _ThreadLock:
+        thread_lock = self._thread_locks.get(thread_id)
+        if thread_lock is None:
+            thread_lock = self._thread_locks[thread_id] = _ThreadLock()
+        thread_lock.users += 1
+        return thread_lock
+
+    def _release_thread_lock(self, thread_id: str, thread_lock: _ThreadLock):
+        thread_lock.users -= 1
+        if thread_lock.users <= 0 and self._thread_locks.get(thread_id) is thread_lock:
+            del self._thread_locks[thread_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取当前的运行与排队情况"""
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "busy_threads": len(self._thread_locks),
+        }
@@ -0,0 +1,19 @@
+import time
+from typing import Optional
+
+
+class ShutdownState:
+    """进程级停机状态：收到退出信号后进入排空阶段，拒绝新的Agent运行，已在执行的运行继续完成"""
+
+    def __init__(self):
+        self.draining = False
+        self.drain_started_at: Optional[float] = None
+
+    def begin_drain(self):
+        """进入排空阶段，重复调用无副作用"""
+        if not self.draining:
+            self.draining = True
+            self.drain_started_at = time.monotonic()
+
+
+shutdown_state = ShutdownState()
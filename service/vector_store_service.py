@@ -1,8 +1,20 @@
+import asyncio
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
 import chromadb
 from langchain_community.embeddings import OllamaEmbeddings
 from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
 
+from cache import CachedEmbeddings, VectorReplica, aget_collection_version, create_cached_embeddings
 from config import settings
+from monitoring import CHROMA_LATENCY, EMBEDDING_LATENCY, VECTOR_REPLICA_LATENCY
+
+logger = logging.getLogger(__name__)
 
 
 class VectorStoreService:
@@ -12,11 +24,38 @@ class VectorStoreService:
         self.embeddings = None
         self.chroma_client = None
         self.vector_store = None
+        self.async_chroma_client = None
+        self.async_collection = None
+        self.distance_metric = "l2"
+        self.embedding_executor = None
+        self._collection_version = ""
+        self._version_checked_at = float("-inf")
+        self.replica: Optional[VectorReplica] = None
+        self._replica_sync: Optional[asyncio.Task] = None
 
     async def initialize(self):
-        """初始化向量存储"""
-        self.embeddings = OllamaEmbeddings(
-            model=settings.embedding_model
+        """初始化向量存储
+
+        同步Chroma客户端在构造时会发起阻塞的HTTP请求，放到线程中执行，与异步客户端的初始化并行
+        """
+        await asyncio.gather(
+            asyncio.to_thread(self._initialize_sync_store),
+            self._initialize_async_collection()
+        )
+
+        self.embedding_executor = ThreadPoolExecutor(
+            max_workers=settings.embedding_max_workers,
+            thread_name_prefix="embedding"
+        )
+
+        if settings.vector_replica_enabled:
+            await self._initialize_replica()
+
+    def _initialize_sync_store(self):
+        """创建embedding与同步的Chroma向量存储（供文档写入等同步接口使用）"""
+        self.embeddings = create_cached_embeddings(
+            OllamaEmbeddings(model=settings.embedding_model, base_url=settings.embedding_base_url),
+            settings.embedding_model
         )
 
         self.chroma_client = chromadb.HttpClient(
@@ -30,6 +69,131 @@ class VectorStoreService:
             embedding_function=self.embeddings,
         )
 
+    async def _initialize_async_collection(self):
+        """异步检索路径：原生异步Chroma客户端 + 有界线程池中的embedding调用"""
+        self.async_chroma_client = await chromadb.AsyncHttpClient(
+            host=settings.chroma_host,
+            port=settings.chroma_port
+        )
+        self.async_collection = await self.async_chroma_client.get_or_create_collection(
+            name=settings.collection_name,
+            embedding_function=None
+        )
+        self.distance_metric = (self.async_collection.metadata or {}).get("hnsw:space", "l2")
+
+    async def _initialize_replica(self):
+        """加载本地向量副本并同步到当前集合版本，同步失败时检索回退到Chroma"""
+        self.replica = VectorReplica(settings.vector_replica_path, settings.vector_replica_sync_batch_size)
+        version = await self.aget_collection_version()
+        # 加载快照需要读取文件并计算向量范数，同样放到线程中
+        if await asyncio.to_thread(self.replica.load_version, version):
+            return
+
+        await asyncio.to_thread(self.replica.load_latest)
+        try:
+            await self.replica.sync(self.async_collection, version)
+        except Exception as e:
+            logger.warning("向量副本同步失败，检索将使用Chroma: %s", e)
+
+    async def _replica_ready(self) -> bool:
+        """副本与集合版本一致时可用；版本变化时在后台增量同步，同步完成前使用Chroma"""
+        version = await self.aget_collection_version()
+        if self.replica.version == version:
+            return True
+        if self._replica_sync is None:
+            self._replica_sync = asyncio.create_task(self._sync_replica(version))
+        return False
+
+    async def _sync_replica(self, version: str):
+        """优先加载其他worker已同步完成的快照（在线程中读取文件），不存在时从Chroma增量同步"""
+        try:
+            if not await asyncio.to_thread(self.replica.load_version, version):
+                await self.replica.sync(self.async_collection, version)
+        except Exception as e:
+            logger.warning("向量副本同步失败，检索将使用Chroma: %s", e)
+        finally:
+            self._replica_sync = None
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """在有界线程池中计算查询向量，避免阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        with EMBEDDING_LATENCY.time():
+            return await loop.run_in_executor(self.embedding_executor, self.embeddings.embed_query, text)
+
+    async def asimilarity_search_with_score(
+            self,
+            query: str,
+            k: int = 3,
+            score_threshold: Optional[float] = None,
+            query_embedding: Optional[List[float]] = None
+    ) -> List[Tuple[Document, float]]:
+        """异步相似度检索，返回(文档, 相关度)列表，相关度越大越相关"""
+        if not self.async_collection:
+            raise RuntimeError("向量存储未初始化")
+
+        if query_embedding is None:
+            query_embedding = await self.aembed_query(query)
+
+        if self.replica and await self._replica_ready():
+            with VECTOR_REPLICA_LATENCY.time():
+                matches = self.replica.query(query_embedding, k, self.distance_metric)
+        else:
+            with CHROMA_LATENCY.time():
+                result = await self.async_collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=k,
+                    include=["documents", "metadatas", "distances"]
+                )
+            matches = zip(result["documents"][0], result["metadatas"][0], result["distances"][0])
+
+        docs_and_scores = []
+        for content, metadata, distance in matches:
+            score = self._relevance_score(distance)
+            if score_threshold is not None and score < score_threshold:
+                continue
+            docs_and_scores.append((Document(page_content=content, metadata=metadata or {}), score))
+
+        return docs_and_scores
+
+    async def aget_collection_version(self) -> str:
+        """获取集合版本号，按配置的间隔刷新，避免每次检索都访问Chroma"""
+        now = time.monotonic()
+        if now - self._version_checked_at >= settings.retrieval_version_check_interval:
+            self._collection_version = await aget_collection_version(
+                self.async_chroma_client, settings.collection_name
+            )
+            self._version_checked_at = now
+        return self._collection_version
+
+    def _relevance_score(self, distance: float) -> float:
+        """将Chroma距离转换为[0, 1]区间的相关度，ip距离为 1 - 内积"""
+        if self.distance_metric in ("cosine", "ip"):
+            score = 1.0 - distance
+        else:
+            score = 1.0 - distance / math.sqrt(2)
+        return min(1.0, max(0.0, score))
+
+    def get_embedding_cache_stats(self) -> Optional[Dict[str, float]]:
+        """获取Embedding缓存命中统计"""
+        if isinstance(self.embeddings, CachedEmbeddings):
+            return self.embeddings.cache.stats()
+        return None
+
+    def get_replica_stats(self) -> Optional[Dict[str, Any]]:
+        """获取进程内向量副本的同步与查询统计"""
+        return self.replica.get_stats() if self.replica else None
+
+    async def close(self):
+        """释放检索线程池与缓存"""
+        if self._replica_sync:
+            self._replica_sync.cancel()
+            self._replica_sync = None
+        if self.embedding_executor:
+            self.embedding_executor.shutdown(wait=False, cancel_futures=True)
+            self.embedding_executor = None
+        if isinstance(self.embeddings, CachedEmbeddings):
+            self.embeddings.cache.close()
+
     def get_vector_store(self) -> Chroma:
         """获取向量存储实例"""
         if not self.vector_store:
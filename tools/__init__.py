@@ -1,5 +1,14 @@
 __all__ = [
-    "KnowledgeBaseTool"
+    "ContextPacker",
+    "KnowledgeBaseTool",
+    "RetrievalPrefetch",
+    "estimate_message_tokens",
+    "estimate_tokens",
+    "timeout_tool",
+    "truncate_to_tokens"
 ]
 
-from .knowledge_base import KnowledgeBaseTool
+from .context_packer import ContextPacker
+from .knowledge_base import KnowledgeBaseTool, RetrievalPrefetch
+from .timeout import timeout_tool
+from .tokens import estimate_message_tokens, estimate_tokens, truncate_to_tokens
@@ -0,0 +1,176 @@
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from tools.tokens import estimate_tokens, truncate_to_tokens
+
+# 近似去重使用的字符n-gram哈希向量维度与n-gram长度
+_SHINGLE_DIM = 4096
+_SHINGLE_SIZE = 3
+# 无start_index时，按文本首尾重叠判断相邻切块的最小重叠长度
+_MIN_TEXT_OVERLAP = 20
+
+
+@dataclass
+class _Passage:
+    """合并后的连续文本片段"""
+    source: str
+    page: Any
+    text: str
+    score: float
+    start: Optional[int] = None
+
+    @property
+    def end(self) -> Optional[int]:
+        return self.start + len(self.text) if self.start is not None else None
+
+
+class ContextPacker:
+    """在token预算内组装检索上下文
+
+    同一来源中重叠或相邻的切块合并为连续片段，内容高度相似的片段只保留相关度最高的一个，
+    按相关度依次放入预算，并只输出简短的来源引用
+    """
+
+    def __init__(self, max_tokens: int, dedup_threshold: float):
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+
+    def pack(self, docs_and_scores: List[Tuple[Document, float]], max_passages: int) -> str:
+        passages = self._deduplicate(self._merge(docs_and_scores))
+        passages.sort(key=lambda passage: passage.score, reverse=True)
+
+        sections = []
+        remaining = self.max_tokens
+        for index, passage in enumerate(passages[:max_passages], start=1):
+            header = f"[{index}] {self._reference(passage)}"
+            section = f"{header}\n{passage.text}"
+            tokens = estimate_tokens(section)
+            if tokens > remaining:
+                # 第一个片段超出预算时截断保留，之后的片段不再放入
+                if sections:
+                    break
+                text = truncate_to_tokens(passage.text, remaining - estimate_tokens(header) - 1)
+                section = f"{header}\n{text}…"
+                tokens = remaining
+            sections.append(section)
+            remaining -= tokens
+
+        return "\n\n".join(sections)
+
+    @classmethod
+    def _merge(cls, docs_and_scores: List[Tuple[Document, float]]) -> List[_Passage]:
+        """合并同一来源中重叠或相邻的切块"""
+        groups: Dict[Tuple[str, Any], List[_Passage]] = {}
+        for doc, score in docs_and_scores:
+            metadata = doc.metadata or {}
+            source = str(metadata.get("source", "未知来源"))
+            page = metadata.get("page") or metadata.get("page_number")
+            start = metadata.get("start_index")
+            passage = _Passage(source, page, doc.page_content, score, start if isinstance(start, int) and start >= 0 else None)
+            groups.setdefault((source, page), []).append(passage)
+
+        merged = []
+        for passages in groups.values():
+            if all(passage.start is not None for passage in passages):
+                merged.extend(cls._merge_by_offset(passages))
+            else:
+                merged.extend(cls._merge_by_text(passages))
+        return merged
+
+    @staticmethod
+    def _merge_by_offset(passages: List[_Passage]) -> List[_Passage]:
+        """按切块在原文中的起始位置合并区间，重叠部分的文本不一致（位置信息过期）时不合并"""
+        passages = sorted(passages, key=lambda passage: passage.start)
+        merged = [passages[0]]
+        for passage in passages[1:]:
+            last = merged[-1]
+            if passage.start <= last.end and _offsets_agree(last, passage):
+                if passage.end > last.end:
+                    last.text += passage.text[last.end - passage.start:]
+                last.score = max(last.score, passage.score)
+            else:
+                merged.append(passage)
+        return merged
+
+    @staticmethod
+    def _merge_by_text(passages: List[_Passage]) -> List[_Passage]:
+        """没有位置信息时，按文本包含关系与首尾重叠合并"""
+        merged: List[_Passage] = []
+        for passage in sorted(passages, key=lambda item: item.score, reverse=True):
+            for existing in merged:
+                if passage.text in existing.text:
+                    break
+                if existing.text in passage.text:
+                    existing.text = passage.text
+                    break
+                overlap = _text_overlap(existing.text, passage.text)
+                if overlap:
+                    existing.text += passage.text[overlap:]
+                    break
+                overlap = _text_overlap(passage.text, existing.text)
+                if overlap:
+                    existing.text = passage.text + existing.text[overlap:]
+                    break
+            else:
+                merged.append(passage)
+        return merged
+
+    def _deduplicate(self, passages: List[_Passage]) -> List[_Passage]:
+        """基于字符n-gram哈希向量的余弦相似度去除近似重复的片段，保留相关度更高的一个"""
+        if len(passages) < 2:
+            return passages
+
+        passages = sorted(passages, key=lambda passage: passage.score, reverse=True)
+        vectors = np.stack([_shingle_vector(passage.text) for passage in passages])
+        similarity = vectors @ vectors.T
+
+        kept: List[int] = []
+        for index in range(len(passages)):
+            if not kept or similarity[index, kept].max() < self.dedup_threshold:
+                kept.append(index)
+        return [passages[index] for index in kept]
+
+    @staticmethod
+    def _reference(passage: _Passage) -> str:
+        """简短的来源引用：文件路径与页码"""
+        if passage.page is not None:
+            return f"{passage.source} 第{passage.page}页"
+        return passage.source
+
+
+def _offsets_agree(last: _Passage, passage: _Passage) -> bool:
+    """按起始位置计算的重叠部分在两个片段中的文本是否一致"""
+    overlap = last.text[passage.start - last.start:]
+    return passage.text.startswith(overlap) or overlap.startswith(passage.text)
+
+
+def _text_overlap(head: str, tail: str) -> int:
+    """head的结尾与tail的开头重叠的长度，不足最小重叠长度时返回0"""
+    if len(tail) < _MIN_TEXT_OVERLAP:
+        return 0
+    probe = tail[:_MIN_TEXT_OVERLAP]
+    position = head.find(probe, max(0, len(head) - len(tail)))
+    while position != -1:
+        if tail.startswith(head[position:]):
+            return len(head) - position
+        position = head.find(probe, position + 1)
+    return 0
+
+
+def _shingle_vector(text: str) -> np.ndarray:
+    """字符n-gram的哈希计数向量（L2归一化）"""
+    text = "".join(text.split())
+    vector = np.zeros(_SHINGLE_DIM, dtype=np.float32)
+    if len(text) < _SHINGLE_SIZE:
+        return vector
+    buckets = [
+        zlib.crc32(text[index:index + _SHINGLE_SIZE].encode("utf-8")) % _SHINGLE_DIM
+        for index in range(len(text) - _SHINGLE_SIZE + 1)
+    ]
+    np.add.at(vector, buckets, 1.0)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
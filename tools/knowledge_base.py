@@ -1,24 +1,191 @@
-from langchain.tools import tool
-from langchain_community.vectorstores import Chroma
+import asyncio
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, StructuredTool
+from pydantic import BaseModel, Field
+
+from cache import RetrievalCache
+from config import settings
+from monitoring.metrics import RETRIEVAL_PREFETCH
+from tools.context_packer import ContextPacker
+
+if TYPE_CHECKING:
+    from service.vector_store_service import VectorStoreService
+
+
+class KnowledgeBaseInput(BaseModel):
+    """知识库检索参数"""
+    query: str = Field(description="检索查询语句")
+    k: int = Field(default=settings.retrieval_k, ge=1, le=20, description="返回的最大片段数量")
+    score_threshold: float = Field(
+        default=settings.retrieval_score_threshold, ge=0.0, le=1.0,
+        description="相关度阈值，低于该值的文档将被过滤"
+    )
 
 
 class KnowledgeBaseTool:
     """知识库工具类"""
 
-    def __init__(self, vector_store: Chroma):
-        self.vector_store = vector_store
+    def __init__(self, vector_store_service: "VectorStoreService"):
+        self.vector_store_service = vector_store_service
+        self.packer = ContextPacker(settings.retrieval_context_max_tokens, settings.retrieval_dedup_threshold)
+        self.cache: Optional[RetrievalCache] = None
+        if settings.retrieval_cache_enabled:
+            self.cache = RetrievalCache(
+                max_size=settings.retrieval_cache_size,
+                ttl=settings.retrieval_cache_ttl,
+                similarity_threshold=settings.retrieval_cache_similarity_threshold
+            )
+
+        self.knowledge_base_retriever: BaseTool = StructuredTool.from_function(
+            coroutine=self._aretrieve,
+            name="knowledge_base_retriever",
+            description="在知识库中搜索信息",
+            args_schema=KnowledgeBaseInput
+        )
+
+    async def _aretrieve(
+            self,
+            query: str,
+            k: int = settings.retrieval_k,
+            score_threshold: float = settings.retrieval_score_threshold,
+            *,
+            config: RunnableConfig
+    ) -> str:
+        """在知识库中搜索信息，候选切块合并去重后按token预算组装
 
-    @tool
-    def knowledge_base_retriever(self, query: str) -> str:
-        """在知识库中搜索信息"""
-        retrieved_docs = self.vector_store.similarity_search(query, k=3)
+        本轮运行带有预取（configurable中的retrieval_prefetch）且查询匹配时直接使用预取结果
+        """
+        candidate_k = max(k, settings.retrieval_candidate_k)
+        prefetch: Optional[RetrievalPrefetch] = (config or {}).get("configurable", {}).get("retrieval_prefetch")
+        docs_and_scores = await prefetch.match(query, candidate_k, score_threshold) if prefetch else None
+        if docs_and_scores is None:
+            docs_and_scores = await self.asearch(query, candidate_k, score_threshold)
 
-        if not retrieved_docs:
+        if not docs_and_scores:
             return "在知识库中没有找到相关信息。"
 
-        serialized = "\n\n".join(
-            (f"来源: {doc.metadata}\n内容: {doc.page_content}")
-            for doc in retrieved_docs
+        return self.packer.pack(docs_and_scores, max_passages=k)
+
+    def prefetch(self, query: str) -> "RetrievalPrefetch":
+        """按模型以默认参数调用工具时的检索参数，提前发起检索"""
+        return RetrievalPrefetch(
+            self, query, max(settings.retrieval_k, settings.retrieval_candidate_k), settings.retrieval_score_threshold
+        )
+
+    async def asearch(
+            self,
+            query: str,
+            k: int,
+            score_threshold: float,
+            query_embedding: Optional[List[float]] = None
+    ) -> List[Tuple[Document, float]]:
+        """经过结果缓存的知识库检索，已计算查询向量时可通过query_embedding传入"""
+        if not self.cache:
+            return await self.vector_store_service.asimilarity_search_with_score(
+                query, k=k, score_threshold=score_threshold, query_embedding=query_embedding
+            )
+
+        version = await self.vector_store_service.aget_collection_version()
+        key = RetrievalCache.make_key(query, k, score_threshold)
+
+        cached = self.cache.get(key, version)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        embedding = query_embedding
+        if self.cache.similarity_threshold is not None:
+            if embedding is None:
+                embedding = await self.vector_store_service.aembed_query(query)
+            cached = self.cache.get_similar(key, version, embedding)
+            if cached is not None:
+                return cached
+
+        docs_and_scores = await self.vector_store_service.asimilarity_search_with_score(
+            query, k=k, score_threshold=score_threshold, query_embedding=embedding
         )
+        self.cache.put(key, docs_and_scores, version, time.perf_counter() - start, embedding)
+
+        return docs_and_scores
+
+    def get_cache_stats(self) -> Optional[Dict[str, float]]:
+        """获取检索缓存统计"""
+        return self.cache.stats() if self.cache else None
+
+
+class RetrievalPrefetch:
+    """与首次模型调用并行、按用户消息提前发起的知识库检索
+
+    模型随后请求的查询与用户消息相近（规范化后相同或向量余弦相似度达到阈值），
+    且检索参数被预取覆盖时直接复用预取结果，省去一次向量化与向量库检索的往返
+    """
+
+    def __init__(self, knowledge_tool: KnowledgeBaseTool, query: str, k: int, score_threshold: float):
+        self.knowledge_tool = knowledge_tool
+        self.query = query
+        self.k = k
+        self.score_threshold = score_threshold
+        self.requested = False
+        self._task = asyncio.create_task(self._search())
+
+    async def _search(self) -> Tuple[List[float], List[Tuple[Document, float]]]:
+        embedding = await self.knowledge_tool.vector_store_service.aembed_query(self.query)
+        docs_and_scores = await self.knowledge_tool.asearch(
+            self.query, self.k, self.score_threshold, query_embedding=embedding
+        )
+        return embedding, docs_and_scores
+
+    async def match(self, query: str, k: int, score_threshold: float) -> Optional[List[Tuple[Document, float]]]:
+        """查询匹配时返回预取结果（按阈值过滤并截取前k个），否则返回None"""
+        self.requested = True
+        if k > self.k or score_threshold < self.score_threshold:
+            RETRIEVAL_PREFETCH.labels("miss").inc()
+            return None
+
+        try:
+            # 共享的预取任务不随某一次工具调用（例如超时）被取消
+            embedding, docs_and_scores = await asyncio.shield(self._task)
+        except Exception:
+            # 预取失败时按正常流程检索，由正常流程报告错误
+            return None
+        except asyncio.CancelledError:
+            # 预取任务已被取消时按未命中处理；当前调用本身被取消时继续传播
+            if not self._task.cancelled():
+                raise
+            RETRIEVAL_PREFETCH.labels("miss").inc()
+            return None
+
+        if _normalize(query) != _normalize(self.query):
+            query_embedding = await self.knowledge_tool.vector_store_service.aembed_query(query)
+            if _cosine(embedding, query_embedding) < settings.retrieval_prefetch_similarity:
+                RETRIEVAL_PREFETCH.labels("miss").inc()
+                return None
+
+        RETRIEVAL_PREFETCH.labels("hit").inc()
+        return [(doc, score) for doc, score in docs_and_scores if score >= score_threshold][:k]
+
+    def close(self):
+        """运行结束时取消尚未完成的预取"""
+        if not self.requested:
+            RETRIEVAL_PREFETCH.labels("unused").inc()
+        if not self._task.done():
+            self._task.cancel()
+        elif not self._task.cancelled():
+            # 取出未被使用的异常，避免事件循环报告未处理的任务异常
+            self._task.exception()
+
+
+def _normalize(text: str) -> str:
+    return "".join(text.split()).lower()
+
 
-        return serialized
+def _cosine(a: List[float], b: List[float]) -> float:
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / norm if norm else 0.0
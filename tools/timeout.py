@@ -0,0 +1,36 @@
+import asyncio
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, StructuredTool
+
+from monitoring.metrics import TOOL_TIMEOUTS
+
+
+def timeout_tool(tool: BaseTool, timeout: float) -> BaseTool:
+    """为工具包装超时，保持原有的名称、描述与参数定义
+
+    实际超时取工具超时与本轮运行剩余时间（configurable中的deadline）的较小值；
+    超时后返回提示而不是抛出异常，由模型根据已有信息继续回答。
+    内层工具只接收configurable，回调置空（否则会从上下文继承），避免同一次调用被记录两次
+    """
+
+    async def call(config: RunnableConfig, **arguments) -> Any:
+        configurable = (config or {}).get("configurable", {})
+        deadline = configurable.get("deadline")
+        limit = min(timeout, deadline.run_remaining()) if deadline is not None else timeout
+        try:
+            return await asyncio.wait_for(
+                tool.ainvoke(arguments, {"configurable": configurable, "callbacks": []}), timeout=limit
+            )
+        except asyncio.TimeoutError:
+            TOOL_TIMEOUTS.labels(tool.name).inc()
+            return f"工具调用超时（{limit:.0f}秒内未返回结果），请根据已有信息回答或换用其他方式"
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=call,
+        metadata=tool.metadata,
+    )
@@ -0,0 +1,50 @@
+import math
+import re
+from typing import List, Sequence
+
+from langchain_core.messages import BaseMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+# 估算token数：中日韩文字与全角标点每个字符约1个token，其他文本约4个字符1个token
+_CHARS_PER_TOKEN = 4
+_CJK_PATTERN = re.compile(
+    r"[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """按字符类型估算token数，中文文本不会像按4个字符1个token那样被严重低估"""
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / _CHARS_PER_TOKEN)
+
+
+def estimate_message_tokens(messages: Sequence[BaseMessage]) -> int:
+    """估算消息列表的token数
+
+    在count_tokens_approximately（含角色、工具调用与每条消息的固定开销）的基础上，
+    将其中按4个字符1个token计算的中日韩文字补足为每个字符1个token
+    """
+    cjk = sum(len(_CJK_PATTERN.findall(_message_text(message))) for message in messages)
+    return count_tokens_approximately(messages) + math.ceil(cjk * (1 - 1 / _CHARS_PER_TOKEN))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截取估算token数不超过max_tokens的最长前缀"""
+    used = 0.0
+    for index, char in enumerate(text):
+        used += 1.0 if _CJK_PATTERN.match(char) else 1.0 / _CHARS_PER_TOKEN
+        if used > max_tokens:
+            return text[:index]
+    return text
+
+
+def _message_text(message: BaseMessage) -> str:
+    """消息中计入token估算的文本：内容与工具调用参数"""
+    content = message.content
+    if isinstance(content, str):
+        parts: List[str] = [content]
+    else:
+        parts = [block if isinstance(block, str) else str(block.get("text", "")) for block in content]
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        parts.append(repr(tool_call.get("args", {})))
+    return "".join(parts)